@@ -6,7 +6,9 @@ Creates all tables with proper indexes and constraints.
 from alembic import op
 import sqlalchemy as sa
 from sqlalchemy import text
-from datetime import datetime
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateColumn
+from datetime import datetime, timedelta
 
 # revision identifiers
 revision = '001_add_authentication'
@@ -14,17 +16,63 @@ down_revision = None
 branch_labels = None
 depends_on = None
 
+# Column types shared across tables. Uuid is native on PostgreSQL and
+# CHAR(32) elsewhere; as_uuid=False keeps the application's str ids.
+UUID = sa.Uuid(as_uuid=False)
+IP_ADDRESS = sa.String(45).with_variant(postgresql.INET(), 'postgresql')
+TOKEN = sa.String(64)  # fixed width: SHA-256 hex
+TOKEN_HASH = sa.LargeBinary(32)  # raw SHA-256 digest (BYTEA on PostgreSQL)
+
+# Tables created with PARTITION BY on PostgreSQL
+PARTITIONED_TABLES = {'audit_logs'}
+AUDIT_LOG_PARTITION_MONTHS = 2  # months created ahead of the current one
+
+# (name, table, columns, unique, where) - created after all tables in upgrade().
+# `where` makes a partial index; columns may be sa.text() for ordering.
+INDEXES = [
+    ('ix_users_email', 'users', ['email'], True, None),
+    # Keyset pagination for the admin user list (newest first)
+    ('idx_users_created_id', 'users', [sa.text('created_at DESC'), sa.text('id DESC')], False, None),
+    ('idx_refresh_token_user_id', 'refresh_tokens', ['user_id'], False, None),
+    ('ix_refresh_tokens_token_hash', 'refresh_tokens', ['token_hash'], True, None),
+    # Covers the refresh lookup (hash, not revoked, not expired) without indexing dead tokens
+    ('idx_rt_active', 'refresh_tokens', ['token_hash', 'expires_at'], False, 'revoked = false'),
+    ('idx_api_key_prefix', 'api_keys', ['key_prefix'], False, None),
+    ('ix_teams_slug', 'teams', ['slug'], True, None),
+    # "Recent activity for user X"; also serves plain user_id lookups
+    ('idx_audit_user_created', 'audit_logs', ['user_id', sa.text('created_at DESC')], False, None),
+    # Login attempts are the one action reviewed by time; a full index on the
+    # high-churn action column only costs writes on the hottest insert path
+    ('idx_audit_login_attempts', 'audit_logs', ['created_at'], False,
+     "action = 'POST /api/auth/login'"),
+    ('idx_audit_resource', 'audit_logs', ['resource_type', 'resource_id'], False, None),
+    ('idx_audit_created_at', 'audit_logs', ['created_at'], False, None),
+    ('idx_project_user_id', 'projects', ['user_id'], False, None),
+    ('idx_project_team_id', 'projects', ['team_id'], False, None),
+    # Low-cardinality status: index only the in-flight projects users poll for
+    ('idx_project_active', 'projects', ['user_id', 'created_at'], False,
+     "status IN ('uploaded', 'analyzing')"),
+    ('idx_project_created_at', 'projects', ['created_at'], False, None),
+    ('idx_project_share_token', 'projects', ['share_token'], False, None),
+    # Clip-in-project lookups resolve in one probe; the project_id prefix
+    # still serves "all clips for a project"
+    ('idx_clip_project_id_id', 'clips', ['project_id', 'id'], False, None),
+    ('idx_clip_score', 'clips', ['score'], False, None),
+    ('idx_clip_category', 'clips', ['category'], False, None),
+    ('idx_setting_user_category', 'settings', ['user_id', 'category'], False, None),
+]
+
 def upgrade():
     """Create authentication and enhanced tables"""
     
     # Create users table
     op.create_table('users',
-        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('id', UUID, nullable=False),
         sa.Column('email', sa.String(), nullable=False),
         sa.Column('full_name', sa.String(), nullable=False),
         sa.Column('hashed_password', sa.String(), nullable=False),
-        sa.Column('is_active', sa.Boolean(), nullable=True, default=True),
-        sa.Column('is_verified', sa.Boolean(), nullable=True, default=False),
+        sa.Column('is_active', sa.Boolean(), nullable=False, server_default=sa.true()),
+        sa.Column('is_verified', sa.Boolean(), nullable=False, server_default=sa.false()),
         sa.Column('roles', sa.JSON(), nullable=True),
         sa.Column('avatar_url', sa.String(), nullable=True),
         sa.Column('bio', sa.Text(), nullable=True),
@@ -32,154 +80,149 @@ def upgrade():
         sa.Column('created_at', sa.DateTime(), nullable=True),
         sa.Column('updated_at', sa.DateTime(), nullable=True),
         sa.Column('last_login_at', sa.DateTime(), nullable=True),
-        sa.Column('failed_login_attempts', sa.Integer(), nullable=True, default=0),
+        sa.Column('failed_login_attempts', sa.Integer(), nullable=False, server_default='0'),
         sa.Column('locked_until', sa.DateTime(), nullable=True),
-        sa.Column('two_factor_enabled', sa.Boolean(), nullable=True, default=False),
+        sa.Column('two_factor_enabled', sa.Boolean(), nullable=False, server_default=sa.false()),
         sa.Column('two_factor_secret', sa.String(), nullable=True),
-        sa.Column('storage_used', sa.Integer(), nullable=True, default=0),
-        sa.Column('api_calls_count', sa.Integer(), nullable=True, default=0),
+        sa.Column('storage_used', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('api_calls_count', sa.Integer(), nullable=False, server_default='0'),
         sa.Column('last_api_call_at', sa.DateTime(), nullable=True),
+        sa.CheckConstraint('failed_login_attempts >= 0', name='ck_users_failed_login_attempts'),
+        sa.CheckConstraint('storage_used >= 0', name='ck_users_storage_used'),
+        sa.CheckConstraint('api_calls_count >= 0', name='ck_users_api_calls_count'),
         sa.PrimaryKeyConstraint('id'),
         sa.UniqueConstraint('email')
     )
-    op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True)
     
     # Create refresh_tokens table
     op.create_table('refresh_tokens',
-        sa.Column('id', sa.String(), nullable=False),
-        sa.Column('token', sa.String(), nullable=False),
-        sa.Column('user_id', sa.String(), nullable=False),
+        sa.Column('id', UUID, nullable=False),
+        # Only the digest is stored; the prefix identifies a token in logs
+        sa.Column('token_hash', TOKEN_HASH, nullable=False),
+        sa.Column('token_prefix', sa.String(8), nullable=True),
+        sa.Column('user_id', UUID, nullable=False),
         sa.Column('created_at', sa.DateTime(), nullable=True),
         sa.Column('expires_at', sa.DateTime(), nullable=False),
-        sa.Column('revoked', sa.Boolean(), nullable=True, default=False),
+        sa.Column('revoked', sa.Boolean(), nullable=False, server_default=sa.false()),
         sa.Column('revoked_at', sa.DateTime(), nullable=True),
         sa.Column('device_info', sa.JSON(), nullable=True),
-        sa.Column('ip_address', sa.String(), nullable=True),
+        sa.Column('ip_address', IP_ADDRESS, nullable=True),
         sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
-        sa.PrimaryKeyConstraint('id'),
-        sa.UniqueConstraint('token')
+        sa.PrimaryKeyConstraint('id')
     )
-    op.create_index('idx_refresh_token_user_id', 'refresh_tokens', ['user_id'])
-    op.create_index('idx_refresh_token_expires', 'refresh_tokens', ['expires_at'])
-    op.create_index(op.f('ix_refresh_tokens_token'), 'refresh_tokens', ['token'], unique=True)
     
     # Create api_keys table
     op.create_table('api_keys',
-        sa.Column('id', sa.String(), nullable=False),
-        sa.Column('user_id', sa.String(), nullable=False),
+        sa.Column('id', UUID, nullable=False),
+        sa.Column('user_id', UUID, nullable=False),
         sa.Column('name', sa.String(), nullable=False),
-        sa.Column('key_hash', sa.String(), nullable=False),
+        sa.Column('key_hash', TOKEN, nullable=False),
         sa.Column('key_prefix', sa.String(), nullable=False),
         sa.Column('scopes', sa.JSON(), nullable=True),
-        sa.Column('rate_limit', sa.Integer(), nullable=True, default=1000),
+        sa.Column('rate_limit', sa.Integer(), nullable=False, server_default='1000'),
         sa.Column('description', sa.Text(), nullable=True),
         sa.Column('created_at', sa.DateTime(), nullable=True),
         sa.Column('last_used_at', sa.DateTime(), nullable=True),
         sa.Column('expires_at', sa.DateTime(), nullable=True),
-        sa.Column('is_active', sa.Boolean(), nullable=True, default=True),
-        sa.Column('usage_count', sa.Integer(), nullable=True, default=0),
+        sa.Column('is_active', sa.Boolean(), nullable=False, server_default=sa.true()),
+        sa.Column('usage_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.CheckConstraint('rate_limit > 0', name='ck_api_keys_rate_limit'),
+        sa.CheckConstraint('usage_count >= 0', name='ck_api_keys_usage_count'),
         sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
         sa.PrimaryKeyConstraint('id'),
         sa.UniqueConstraint('user_id', 'name')
     )
-    op.create_index('idx_api_key_prefix', 'api_keys', ['key_prefix'])
     
     # Create teams table
     op.create_table('teams',
-        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('id', UUID, nullable=False),
         sa.Column('name', sa.String(), nullable=False),
         sa.Column('slug', sa.String(), nullable=False),
         sa.Column('description', sa.Text(), nullable=True),
-        sa.Column('subscription_tier', sa.String(), nullable=True, default='free'),
+        sa.Column('subscription_tier', sa.String(), nullable=False, server_default='free'),
         sa.Column('subscription_expires_at', sa.DateTime(), nullable=True),
-        sa.Column('storage_limit', sa.Integer(), nullable=True, default=5000000000),
-        sa.Column('storage_used', sa.Integer(), nullable=True, default=0),
+        sa.Column('storage_limit', sa.BigInteger(), nullable=False, server_default='5000000000'),
+        sa.Column('storage_used', sa.BigInteger(), nullable=False, server_default='0'),
         sa.Column('created_at', sa.DateTime(), nullable=True),
         sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.CheckConstraint('storage_used >= 0 AND storage_limit >= 0', name='ck_teams_storage'),
         sa.PrimaryKeyConstraint('id'),
         sa.UniqueConstraint('slug')
     )
-    op.create_index(op.f('ix_teams_slug'), 'teams', ['slug'], unique=True)
     
     # Create user_teams association table
     op.create_table('user_teams',
-        sa.Column('user_id', sa.String(), nullable=True),
-        sa.Column('team_id', sa.String(), nullable=True),
-        sa.Column('role', sa.String(), nullable=True, default='member'),
+        sa.Column('user_id', UUID, nullable=True),
+        sa.Column('team_id', UUID, nullable=True),
+        sa.Column('role', sa.String(), nullable=False, server_default='member'),
         sa.Column('joined_at', sa.DateTime(), nullable=True),
         sa.ForeignKeyConstraint(['team_id'], ['teams.id'], ),
         sa.ForeignKeyConstraint(['user_id'], ['users.id'], )
     )
     
-    # Create audit_logs table
+    # Create audit_logs table, range-partitioned by month on PostgreSQL so
+    # old months can be detached/dropped instead of DELETEd. The partition
+    # key has to be part of the primary key.
     op.create_table('audit_logs',
-        sa.Column('id', sa.String(), nullable=False),
-        sa.Column('user_id', sa.String(), nullable=True),
+        sa.Column('id', UUID, nullable=False),
+        sa.Column('user_id', UUID, nullable=True),
         sa.Column('action', sa.String(), nullable=False),
         sa.Column('resource_type', sa.String(), nullable=True),
         sa.Column('resource_id', sa.String(), nullable=True),
-        sa.Column('ip_address', sa.String(), nullable=True),
+        sa.Column('ip_address', IP_ADDRESS, nullable=True),
         sa.Column('user_agent', sa.Text(), nullable=True),
         sa.Column('request_method', sa.String(), nullable=True),
         sa.Column('request_path', sa.String(), nullable=True),
         sa.Column('details', sa.JSON(), nullable=True),
-        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
         sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
-        sa.PrimaryKeyConstraint('id')
+        sa.PrimaryKeyConstraint('id', 'created_at'),
+        postgresql_partition_by='RANGE (created_at)'
     )
-    op.create_index('idx_audit_user_id', 'audit_logs', ['user_id'])
-    op.create_index('idx_audit_action', 'audit_logs', ['action'])
-    op.create_index('idx_audit_resource', 'audit_logs', ['resource_type', 'resource_id'])
-    op.create_index('idx_audit_created_at', 'audit_logs', ['created_at'])
+    if op.get_bind().dialect.name == 'postgresql':
+        _create_audit_log_partitions()
     
     # Add user_id to existing projects table
-    with op.batch_alter_table('projects') as batch_op:
-        batch_op.add_column(sa.Column('user_id', sa.String(), nullable=True))
-        batch_op.add_column(sa.Column('team_id', sa.String(), nullable=True))
-        batch_op.add_column(sa.Column('source_url', sa.String(), nullable=True))
-        batch_op.add_column(sa.Column('error_message', sa.Text(), nullable=True))
-        batch_op.add_column(sa.Column('analysis_provider', sa.String(), nullable=True))
-        batch_op.add_column(sa.Column('analysis_model', sa.String(), nullable=True))
-        batch_op.add_column(sa.Column('analysis_settings', sa.JSON(), nullable=True))
-        batch_op.add_column(sa.Column('file_path', sa.String(), nullable=True))
-        batch_op.add_column(sa.Column('file_size', sa.Integer(), nullable=True))
-        batch_op.add_column(sa.Column('processing_started_at', sa.DateTime(), nullable=True))
-        batch_op.add_column(sa.Column('processing_completed_at', sa.DateTime(), nullable=True))
-        batch_op.add_column(sa.Column('processing_time_seconds', sa.Float(), nullable=True))
-        batch_op.add_column(sa.Column('analysis_cost', sa.Float(), nullable=True, default=0.0))
-        batch_op.add_column(sa.Column('storage_cost', sa.Float(), nullable=True, default=0.0))
-        batch_op.add_column(sa.Column('is_public', sa.Boolean(), nullable=True, default=False))
-        batch_op.add_column(sa.Column('share_token', sa.String(), nullable=True))
-        batch_op.create_foreign_key('fk_projects_user_id', 'users', ['user_id'], ['id'])
-        batch_op.create_foreign_key('fk_projects_team_id', 'teams', ['team_id'], ['id'])
-    
-    op.create_index('idx_project_user_id', 'projects', ['user_id'])
-    op.create_index('idx_project_team_id', 'projects', ['team_id'])
-    op.create_index('idx_project_status', 'projects', ['status'])
-    op.create_index('idx_project_created_at', 'projects', ['created_at'])
-    op.create_index('idx_project_share_token', 'projects', ['share_token'])
+    _add_columns('projects', [
+        sa.Column('user_id', UUID, nullable=True),
+        sa.Column('team_id', UUID, nullable=True),
+        sa.Column('source_url', sa.String(), nullable=True),
+        sa.Column('error_message', sa.Text(), nullable=True),
+        sa.Column('analysis_provider', sa.String(), nullable=True),
+        sa.Column('analysis_model', sa.String(), nullable=True),
+        sa.Column('analysis_settings', sa.JSON(), nullable=True),
+        sa.Column('file_path', sa.String(), nullable=True),
+        sa.Column('file_size', sa.BigInteger(), nullable=True),
+        sa.Column('processing_started_at', sa.DateTime(), nullable=True),
+        sa.Column('processing_completed_at', sa.DateTime(), nullable=True),
+        sa.Column('processing_time_seconds', sa.Float(), nullable=True),
+        sa.Column('analysis_cost', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('storage_cost', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('is_public', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column('share_token', sa.String(), nullable=True)
+    ], foreign_keys=[
+        ('fk_projects_user_id', 'users', ['user_id'], ['id']),
+        ('fk_projects_team_id', 'teams', ['team_id'], ['id'])
+    ])
     
     # Enhance clips table
-    with op.batch_alter_table('clips') as batch_op:
-        batch_op.add_column(sa.Column('duration', sa.Float(), nullable=True))
-        batch_op.add_column(sa.Column('confidence', sa.Float(), nullable=True))
-        batch_op.add_column(sa.Column('analysis_reason', sa.Text(), nullable=True))
-        batch_op.add_column(sa.Column('category', sa.String(), nullable=True))
-        batch_op.add_column(sa.Column('is_exported', sa.Boolean(), nullable=True, default=False))
-        batch_op.add_column(sa.Column('export_path', sa.String(), nullable=True))
-        batch_op.add_column(sa.Column('thumbnail_path', sa.String(), nullable=True))
-        batch_op.add_column(sa.Column('is_favorite', sa.Boolean(), nullable=True, default=False))
-        batch_op.add_column(sa.Column('user_notes', sa.Text(), nullable=True))
-        batch_op.add_column(sa.Column('view_count', sa.Integer(), nullable=True, default=0))
-        batch_op.add_column(sa.Column('exported_at', sa.DateTime(), nullable=True))
-    
-    op.create_index('idx_clip_project_id', 'clips', ['project_id'])
-    op.create_index('idx_clip_score', 'clips', ['score'])
-    op.create_index('idx_clip_category', 'clips', ['category'])
+    _add_columns('clips', [
+        sa.Column('duration', sa.Float(), nullable=True),
+        sa.Column('confidence', sa.Float(), nullable=True),
+        sa.Column('analysis_reason', sa.Text(), nullable=True),
+        sa.Column('category', sa.String(), nullable=True),
+        sa.Column('is_exported', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column('export_path', sa.String(), nullable=True),
+        sa.Column('thumbnail_path', sa.String(), nullable=True),
+        sa.Column('is_favorite', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column('user_notes', sa.Text(), nullable=True),
+        sa.Column('view_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('exported_at', sa.DateTime(), nullable=True)
+    ])
     
     # Create analysis_results table
     op.create_table('analysis_results',
-        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('id', UUID, nullable=False),
         sa.Column('project_id', sa.String(), nullable=False),
         sa.Column('provider', sa.String(), nullable=False),
         sa.Column('model', sa.String(), nullable=False),
@@ -197,39 +240,103 @@ def upgrade():
     )
     
     # Update settings table for user-specific settings
-    with op.batch_alter_table('settings') as batch_op:
-        batch_op.add_column(sa.Column('user_id', sa.String(), nullable=True))
-        batch_op.add_column(sa.Column('is_encrypted', sa.Boolean(), nullable=True, default=False))
-        batch_op.add_column(sa.Column('description', sa.Text(), nullable=True))
-        batch_op.create_foreign_key('fk_settings_user_id', 'users', ['user_id'], ['id'])
-        batch_op.create_unique_constraint('uq_settings_user_category_key', ['user_id', 'category', 'key'])
+    _add_columns('settings', [
+        sa.Column('user_id', UUID, nullable=True),
+        sa.Column('is_encrypted', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column('description', sa.Text(), nullable=True)
+    ], foreign_keys=[
+        ('fk_settings_user_id', 'users', ['user_id'], ['id'])
+    ], unique_constraints=[
+        ('uq_settings_user_category_key', ['user_id', 'category', 'key'])
+    ])
+    
+    # Build all indexes in one pass once every table exists
+    _create_indexes()
+
+
+def _add_columns(table, columns, foreign_keys=(), unique_constraints=()):
+    """
+    Add columns and constraints to an existing table. PostgreSQL gets a
+    single ALTER TABLE so the catalog is rewritten and locked only once;
+    other dialects (SQLite) go through batch_alter_table.
+    """
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        with op.batch_alter_table(table) as batch_op:
+            for column in columns:
+                batch_op.add_column(column)
+            for name, referent, local_cols, remote_cols in foreign_keys:
+                batch_op.create_foreign_key(name, referent, local_cols, remote_cols)
+            for name, cols in unique_constraints:
+                batch_op.create_unique_constraint(name, cols)
+        return
+    
+    # Bind the columns to a throwaway Table so CreateColumn can render them
+    sa.Table(table, sa.MetaData(), *columns)
+    clauses = [
+        f"ADD COLUMN {CreateColumn(column).compile(dialect=bind.dialect)}"
+        for column in columns
+    ]
+    for name, referent, local_cols, remote_cols in foreign_keys:
+        clauses.append(
+            f"ADD CONSTRAINT {name} FOREIGN KEY ({', '.join(local_cols)}) "
+            f"REFERENCES {referent} ({', '.join(remote_cols)})"
+        )
+    for name, cols in unique_constraints:
+        clauses.append(f"ADD CONSTRAINT {name} UNIQUE ({', '.join(cols)})")
+    
+    op.execute(f"ALTER TABLE {table} " + ", ".join(clauses))
+
+
+def _create_audit_log_partitions(months_ahead=AUDIT_LOG_PARTITION_MONTHS):
+    """
+    Create monthly audit_logs partitions from the current month onwards,
+    plus a DEFAULT partition so inserts never fail if the scheduled job
+    that adds future months falls behind.
+    """
+    start = datetime.utcnow().date().replace(day=1)
+    for _ in range(months_ahead + 1):
+        end = (start + timedelta(days=32)).replace(day=1)
+        op.execute(
+            f"CREATE TABLE IF NOT EXISTS audit_logs_{start:%Y_%m} PARTITION OF audit_logs "
+            f"FOR VALUES FROM ('{start}') TO ('{end}')"
+        )
+        start = end
+    op.execute("CREATE TABLE IF NOT EXISTS audit_logs_default PARTITION OF audit_logs DEFAULT")
+
+
+def _create_indexes():
+    """
+    Create INDEXES. On PostgreSQL each index is built with CREATE INDEX
+    CONCURRENTLY outside the migration transaction, so writers are never
+    blocked; other dialects fall back to plain create_index.
+    """
+    if op.get_bind().dialect.name != 'postgresql':
+        for name, table, columns, unique, where in INDEXES:
+            kwargs = {'sqlite_where': sa.text(where)} if where else {}
+            op.create_index(name, table, columns, unique=unique, **kwargs)
+        return
     
-    op.create_index('idx_setting_user_category', 'settings', ['user_id', 'category'])
+    with op.get_context().autocommit_block():
+        for name, table, columns, unique, where in INDEXES:
+            # CONCURRENTLY isn't supported on partitioned parents (which are
+            # empty here anyway)
+            concurrently = '' if table in PARTITIONED_TABLES else 'CONCURRENTLY '
+            sql = (
+                f"CREATE {'UNIQUE ' if unique else ''}INDEX {concurrently}IF NOT EXISTS "
+                f"{name} ON {table} ({', '.join(str(c) for c in columns)})"
+            )
+            if where:
+                sql += f" WHERE {where}"
+            op.execute(sql)
 
 
 def downgrade():
     """Drop authentication tables and revert changes"""
     
     # Drop indexes first
-    op.drop_index('idx_setting_user_category', table_name='settings')
-    op.drop_index('idx_clip_category', table_name='clips')
-    op.drop_index('idx_clip_score', table_name='clips')
-    op.drop_index('idx_clip_project_id', table_name='clips')
-    op.drop_index('idx_project_share_token', table_name='projects')
-    op.drop_index('idx_project_created_at', table_name='projects')
-    op.drop_index('idx_project_status', table_name='projects')
-    op.drop_index('idx_project_team_id', table_name='projects')
-    op.drop_index('idx_project_user_id', table_name='projects')
-    op.drop_index('idx_audit_created_at', table_name='audit_logs')
-    op.drop_index('idx_audit_resource', table_name='audit_logs')
-    op.drop_index('idx_audit_action', table_name='audit_logs')
-    op.drop_index('idx_audit_user_id', table_name='audit_logs')
-    op.drop_index('idx_api_key_prefix', table_name='api_keys')
-    op.drop_index(op.f('ix_teams_slug'), table_name='teams')
-    op.drop_index(op.f('ix_refresh_tokens_token'), table_name='refresh_tokens')
-    op.drop_index('idx_refresh_token_expires', table_name='refresh_tokens')
-    op.drop_index('idx_refresh_token_user_id', table_name='refresh_tokens')
-    op.drop_index(op.f('ix_users_email'), table_name='users')
+    for name, table, *_ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
     
     # Remove columns from existing tables
     with op.batch_alter_table('settings') as batch_op:
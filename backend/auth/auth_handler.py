@@ -3,41 +3,247 @@ Enterprise-grade JWT authentication handler with refresh token rotation.
 Implements OWASP security best practices for token-based authentication.
 """
 
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Dict, Any, Tuple
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status, Request
+from typing import Optional, Dict, Any, List, Tuple
+import jwt
+from argon2 import PasswordHasher, Type
+from argon2.exceptions import InvalidHashError, VerificationError
+from fastapi import BackgroundTasks, Depends, HTTPException, status, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import bindparam, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+from cachetools import TTLCache
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import base64
+import bcrypt
+import functools
+import hashlib
+import hmac
 import secrets
-import redis
+import time
+import orjson
+import redis.asyncio as redis
 from pydantic import BaseModel, EmailStr
 import logging
 
 from ..models.database import User, RefreshToken
-from ..utils.db_manager import get_db
-from ..config import settings
+from ..utils.db_manager import AsyncSessionLocal, get_async_db
+from .user_repository import AsyncUserRepository
+from ..config import settings, REDIS_URL
 
 logger = logging.getLogger(__name__)
 
 # Security configuration
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# argon2id for new hashes; bcrypt kept so existing hashes still verify.
+# Both are called directly rather than through passlib's scheme detection.
+password_hasher = PasswordHasher(
+    time_cost=settings.ARGON2_TIME_COST,
+    memory_cost=settings.ARGON2_MEMORY_COST,
+    parallelism=settings.ARGON2_PARALLELISM,
+    type=Type.ID
+)
+
+def _verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Check a password against an argon2id or legacy bcrypt ($2*) hash"""
+    try:
+        if hashed_password.startswith("$2"):
+            return bcrypt.checkpw(plain_password.encode(), hashed_password.encode())
+        return password_hasher.verify(hashed_password, plain_password)
+    except (VerificationError, InvalidHashError, ValueError):
+        return False
+
 security = HTTPBearer()
 
-# Redis for token blacklisting and rate limiting
-redis_client = redis.Redis(
-    host=settings.REDIS_HOST,
-    port=settings.REDIS_PORT,
-    db=0,
-    decode_responses=True
+# Redis for token blacklisting and rate limiting (shared across workers)
+redis_client = redis.Redis.from_url(
+    REDIS_URL,
+    decode_responses=True,
+    max_connections=50
+)
+
+# Sliding-window log: drop entries older than the window, count what's
+# left, admit and record this hit if under the limit. Returns
+# {allowed, remaining, ms_until_reset}; one atomic EVALSHA per request.
+_RATE_LIMIT_SCRIPT = redis_client.register_script("""
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', key, 0, now - window)
+local count = redis.call('ZCARD', key)
+local allowed = 0
+if count < limit then
+    redis.call('ZADD', key, now, ARGV[4])
+    redis.call('PEXPIRE', key, window)
+    count = count + 1
+    allowed = 1
+end
+local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+local reset = window
+if oldest[2] then
+    reset = tonumber(oldest[2]) + window - now
+end
+return {allowed, limit - count, reset}
+""")
+
+# GCRA: a single theoretical-arrival-time value per key. Admits bursts up
+# to the tolerance, then one request per emission interval. Returns
+# {allowed, ms_until_allowed}.
+_GCRA_SCRIPT = redis_client.register_script("""
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local tolerance = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+local new_tat = math.max(tat, now) + interval
+local allow_at = new_tat - tolerance
+if now < allow_at then
+    return {0, allow_at - now}
+end
+redis.call('SET', KEYS[1], new_tat, 'PX', new_tat - now)
+return {1, 0}
+""")
+
+# Rotate a refresh token atomically: revoke it and return its active user
+_ROTATE_REFRESH_TOKEN_SQL = text("""
+    WITH old AS (
+        UPDATE refresh_tokens
+        SET revoked = true, revoked_at = now()
+        WHERE token_hash = :token_hash AND revoked = false AND expires_at > now()
+        RETURNING user_id
+    )
+    SELECT u.* FROM users u JOIN old ON u.id = old.user_id
+    WHERE u.is_active = true
+""")
+
+# Bloom filter of rotated-out refresh tokens, checked before SQL so reuse
+# detection costs one pipelined round-trip on the refresh path. A hit is
+# only a candidate and is confirmed against the database.
+_REVOKED_FILTER_KEY = "revoked_bf"
+_REVOKED_FILTER_BITS = 1 << 24
+_REVOKED_FILTER_HASHES = 7
+# How far before a rebuild's scan to re-apply revocations after the swap,
+# covering transactions that stamped revoked_at before the scan but
+# committed after it
+_REVOKED_FILTER_REBUILD_SLACK = timedelta(minutes=5)
+
+def _revoked_filter_positions(token_hash: bytes) -> List[int]:
+    """Bit offsets for a token hash (double hashing over one blake2b digest)"""
+    digest = hashlib.blake2b(token_hash, digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "big")
+    h2 = int.from_bytes(digest[8:], "big") | 1
+    return [(h1 + i * h2) % _REVOKED_FILTER_BITS for i in range(_REVOKED_FILTER_HASHES)]
+
+# User columns read by token issuing, auth checks, /me and the quota
+# checks in main; the rest (preferences, bio, 2FA secret, ...) are not
+# loaded and must be fetched explicitly by the routes that need them
+_TOKEN_USER_COLUMNS = (
+    User.id, User.email, User.full_name, User.roles, User.is_active, User.created_at,
+    User.updated_at, User.storage_used, User.api_calls_count
 )
 
+# Built once so SQLAlchemy's compiled-statement cache is always hit
+_CURRENT_USER_QUERY = select(User).options(
+    load_only(*_TOKEN_USER_COLUMNS)
+).where(User.id == bindparam("user_id"))
+
+def _b64url_decode(segment: str) -> bytes:
+    """Decode unpadded base64url"""
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+def _b64url_encode(data: bytes) -> str:
+    """Encode as unpadded base64url"""
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+# Header segment PyJWT emits for HS256 tokens; _encode_jwt reuses it and
+# _decode_jwt uses it to skip parsing the header of our own tokens
+_HS256_HEADER_B64 = _b64url_encode(orjson.dumps({"alg": "HS256", "typ": "JWT"}))
+
+# Raw size of an issued refresh token (before base64url)
+_REFRESH_TOKEN_BYTES = 32
+
+def _hash_token(token: str) -> Optional[bytes]:
+    """
+    SHA-256 digest of a refresh token's raw bytes, as stored in the DB.
+    Returns None if the wire value isn't valid base64url or isn't the
+    size of a token we issue, so garbage is rejected without a DB probe.
+    """
+    try:
+        raw = _b64url_decode(token)
+    except ValueError:  # binascii.Error
+        return None
+    if len(raw) != _REFRESH_TOKEN_BYTES:
+        return None
+    return hashlib.sha256(raw).digest()
+
+def _new_refresh_token(
+    token_hash: bytes, token_prefix: str, user_id: str, expires_at: datetime
+) -> RefreshToken:
+    """Build a RefreshToken row; only the hash and a short prefix are kept"""
+    return RefreshToken(
+        token_hash=token_hash,
+        token_prefix=token_prefix,
+        user_id=user_id,
+        expires_at=expires_at,
+        created_at=datetime.now(timezone.utc),
+        device_info=None  # Can be extended for device tracking
+    )
+
+async def _persist_refresh_token(
+    token_hash: bytes, token_prefix: str, user_id: str, expires_at: datetime
+) -> None:
+    """Store a refresh token in its own session (run as a background task)"""
+    async with AsyncSessionLocal() as db:
+        db.add(_new_refresh_token(token_hash, token_prefix, user_id, expires_at))
+        await db.commit()
+
 class TokenData(BaseModel):
     """Token payload structure"""
     user_id: str
     email: str
     roles: list[str] = []
+    is_active: bool = True
+    
+@dataclass(frozen=True)
+class ClaimsUser:
+    """Lightweight user built from verified token claims, no DB access"""
+    id: str
+    email: str
+    roles: list[str]
+    is_active: bool
+    
+@dataclass(frozen=True, slots=True)
+class CurrentUser:
+    """
+    Snapshot of the authenticated user's row (the _TOKEN_USER_COLUMNS).
+    Holds no session state, so one instance can be cached and shared by
+    concurrent requests.
+    """
+    id: str
+    email: str
+    full_name: Optional[str]
+    roles: Tuple[str, ...]
+    is_active: bool
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+    storage_used: int
+    api_calls_count: int
+    
+    @classmethod
+    def from_user(cls, user: User) -> "CurrentUser":
+        return cls(
+            id=str(user.id),
+            email=user.email,
+            full_name=user.full_name,
+            roles=tuple(user.roles or ()),
+            is_active=user.is_active,
+            created_at=user.created_at,
+            updated_at=user.updated_at,
+            storage_used=user.storage_used or 0,
+            api_calls_count=user.api_calls_count or 0
+        )
     
 class TokenPair(BaseModel):
     """Access and refresh token pair"""
@@ -57,64 +263,189 @@ class AuthHandler:
         self.algorithm = settings.JWT_ALGORITHM
         self.access_token_expire_minutes = settings.ACCESS_TOKEN_EXPIRE_MINUTES
         self.refresh_token_expire_days = settings.REFRESH_TOKEN_EXPIRE_DAYS
+        self._secret_bytes = self.secret_key.encode()
         
-    def verify_password(self, plain_password: str, hashed_password: str) -> bool:
-        """Verify password against hash using bcrypt"""
-        return pwd_context.verify(plain_password, hashed_password)
+        # Verified payloads keyed by token digest. Signatures never change,
+        # so entries only need to live as long as the token itself.
+        self._payload_cache = TTLCache(
+            maxsize=settings.TOKEN_CACHE_SIZE,
+            ttl=self.access_token_expire_minutes * 60
+        )
+        # JTIs confirmed absent from the Redis blacklist. Kept short so a
+        # revocation made by another worker is picked up quickly.
+        self._blacklist_cache = TTLCache(
+            maxsize=settings.TOKEN_CACHE_SIZE,
+            ttl=settings.TOKEN_BLACKLIST_CACHE_SECONDS
+        )
+        # (CurrentUser, loaded_at) by user id, so bursts of requests from one
+        # user (dashboards polling /me) skip the SELECT. Kept very short;
+        # entries older than the user's user_invalidated: mark (set by
+        # invalidate_user_claims on any worker) are reloaded. Entries can
+        # lag writes, so quota checks read the usage counters
+        # (storage_used, api_calls_count) from the database instead.
+        self._user_cache = TTLCache(
+            maxsize=settings.TOKEN_CACHE_SIZE,
+            ttl=settings.CURRENT_USER_CACHE_SECONDS
+        )
+        # Dedicated pool for argon2/bcrypt: both release the GIL, so one
+        # thread per core lets concurrent logins hash in parallel without
+        # starving the default executor used elsewhere
+        self._hash_executor = ThreadPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            thread_name_prefix="password-hash"
+        )
+        
+    async def verify_password(self, plain_password: str, hashed_password: str) -> bool:
+        """
+        Verify password against hash (argon2id, or legacy bcrypt).
+        Runs on the hashing pool so it doesn't block the event loop.
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            self._hash_executor, _verify_password, plain_password, hashed_password
+        )
+    
+    async def get_password_hash(self, password: str) -> str:
+        """Generate argon2id hash off the event loop"""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._hash_executor, password_hasher.hash, password
+        )
     
-    def get_password_hash(self, password: str) -> str:
-        """Generate bcrypt hash with appropriate cost factor"""
-        return pwd_context.hash(password)
+    def password_needs_rehash(self, hashed_password: str) -> bool:
+        """True for legacy bcrypt hashes or argon2 hashes with old parameters"""
+        if hashed_password.startswith("$2"):
+            return True
+        try:
+            return password_hasher.check_needs_rehash(hashed_password)
+        except InvalidHashError:
+            return True
     
     def create_access_token(self, data: TokenData) -> str:
         """
         Create JWT access token with user claims.
         Implements short-lived tokens for security.
         """
-        to_encode = data.dict()
-        expire = datetime.now(timezone.utc) + timedelta(minutes=self.access_token_expire_minutes)
+        to_encode = data.model_dump()
+        now = int(time.time())
         to_encode.update({
-            "exp": expire,
-            "iat": datetime.now(timezone.utc),
+            "exp": now + self.access_token_expire_minutes * 60,
+            "iat": now,
             "type": "access",
             "jti": secrets.token_urlsafe(16)  # JWT ID for revocation
         })
         
-        encoded_jwt = jwt.encode(to_encode, self.secret_key, algorithm=self.algorithm)
-        return encoded_jwt
+        return self._encode_jwt(to_encode)
+    
+    def _encode_jwt(self, payload: Dict[str, Any]) -> str:
+        """
+        Sign a JWT. HS256 tokens are assembled directly (orjson payload,
+        pre-encoded header, one HMAC-SHA256); other algorithms use PyJWT.
+        Claims must already be JSON-native (timestamps as ints).
+        """
+        if self.algorithm != "HS256":
+            return jwt.encode(payload, self.secret_key, algorithm=self.algorithm)
+        
+        signing_input = _HS256_HEADER_B64 + "." + _b64url_encode(orjson.dumps(payload))
+        signature = hmac.new(self._secret_bytes, signing_input.encode(), hashlib.sha256).digest()
+        return signing_input + "." + _b64url_encode(signature)
     
-    def create_refresh_token(self, user_id: str, db: Session) -> str:
+    async def create_refresh_token(
+        self,
+        user_id: str,
+        db: AsyncSession,
+        background_tasks: Optional[BackgroundTasks] = None
+    ) -> str:
         """
         Create secure refresh token with database tracking.
-        Implements token rotation on each refresh.
+        When background_tasks is given the INSERT runs after the response
+        has been sent; only use that for fresh logins, never for rotation,
+        where a lost INSERT would leave the client with no valid token.
         """
+        token, token_hash, expires_at = self._generate_refresh_token()
+        
+        if background_tasks is not None:
+            background_tasks.add_task(
+                _persist_refresh_token, token_hash, token[:8], user_id, expires_at
+            )
+        else:
+            db.add(_new_refresh_token(token_hash, token[:8], user_id, expires_at))
+            await db.commit()
+        
+        return token
+    
+    def _decode_jwt(self, token: str) -> Dict[str, Any]:
+        """
+        Verify and decode a JWT. Our own HS256 tokens are checked with a
+        direct HMAC-SHA256 against the pre-encoded key; anything else goes
+        through PyJWT. Raises the same PyJWT exceptions either way.
+        """
+        header_b64, _, rest = token.partition(".")
+        if header_b64 != _HS256_HEADER_B64 or self.algorithm != "HS256":
+            return jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+        
+        payload_b64, _, signature_b64 = rest.partition(".")
+        try:
+            signature = _b64url_decode(signature_b64)
+            expected = hmac.new(
+                self._secret_bytes, token[:len(header_b64) + 1 + len(payload_b64)].encode(),
+                hashlib.sha256
+            ).digest()
+            if not hmac.compare_digest(expected, signature):
+                raise jwt.InvalidSignatureError("Signature verification failed")
+            payload = orjson.loads(_b64url_decode(payload_b64))
+        except (ValueError, orjson.JSONDecodeError) as e:
+            raise jwt.DecodeError(str(e))
+        if not isinstance(payload, dict):
+            raise jwt.DecodeError("Invalid payload")
+        
+        now = time.time()
+        if "exp" in payload and payload["exp"] <= now:
+            raise jwt.ExpiredSignatureError("Signature has expired")
+        if "nbf" in payload and payload["nbf"] > now:
+            raise jwt.ImmatureSignatureError("The token is not yet valid (nbf)")
+        return payload
+    
+    def _generate_refresh_token(self) -> Tuple[str, bytes, datetime]:
+        """New refresh token as (wire value, stored hash, expiry)"""
         # Generate cryptographically secure token
-        token = secrets.token_urlsafe(32)
+        # Hash the raw bytes; base64url is only the wire encoding
+        raw = secrets.token_bytes(_REFRESH_TOKEN_BYTES)
+        token = base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
         expires_at = datetime.now(timezone.utc) + timedelta(days=self.refresh_token_expire_days)
+        return token, hashlib.sha256(raw).digest(), expires_at
+    
+    async def create_login_token_pair(self, user: User, db: AsyncSession) -> TokenPair:
+        """
+        Token pair for a fresh login. The refresh token insert and the
+        last-login update go to the database as a single statement.
+        """
+        token, token_hash, expires_at = self._generate_refresh_token()
+        await AsyncUserRepository.record_login(db, str(user.id), token_hash, token[:8], expires_at)
         
-        # Store in database for validation and revocation
-        refresh_token = RefreshToken(
-            token=token,
-            user_id=user_id,
-            expires_at=expires_at,
-            created_at=datetime.now(timezone.utc),
-            device_info=None  # Can be extended for device tracking
+        return TokenPair(
+            access_token=self.create_access_token(self._token_data(user)),
+            refresh_token=token,
+            expires_in=self.access_token_expire_minutes * 60
         )
-        db.add(refresh_token)
-        db.commit()
-        
-        return token
     
-    def create_token_pair(self, user: User, db: Session) -> TokenPair:
-        """Generate both access and refresh tokens"""
-        token_data = TokenData(
+    @staticmethod
+    def _token_data(user: User) -> TokenData:
+        """Access token claims for a user"""
+        return TokenData(
             user_id=str(user.id),
             email=user.email,
-            roles=user.roles or []
+            roles=user.roles or [],
+            is_active=user.is_active
         )
-        
-        access_token = self.create_access_token(token_data)
-        refresh_token = self.create_refresh_token(str(user.id), db)
+    
+    async def create_token_pair(
+        self,
+        user: User,
+        db: AsyncSession,
+        background_tasks: Optional[BackgroundTasks] = None
+    ) -> TokenPair:
+        """Generate both access and refresh tokens"""
+        access_token = self.create_access_token(self._token_data(user))
+        refresh_token = await self.create_refresh_token(str(user.id), db, background_tasks)
         
         return TokenPair(
             access_token=access_token,
@@ -122,69 +453,219 @@ class AuthHandler:
             expires_in=self.access_token_expire_minutes * 60
         )
     
-    def decode_token(self, token: str) -> Dict[str, Any]:
+    async def decode_token(self, token: str) -> Dict[str, Any]:
         """
         Decode and validate JWT token.
-        Checks expiration and blacklist status.
+        Checks expiration and blacklist status, serving repeat tokens
+        from the in-process caches.
         """
-        try:
-            # Check if token is blacklisted
-            jti = self._extract_jti(token)
-            if jti and redis_client.get(f"blacklist:{jti}"):
+        cache_key = self._token_cache_key(token)
+        payload = self._payload_cache.get(cache_key)
+        
+        if payload is None:
+            try:
+                payload = self._decode_jwt(token)
+            except jwt.ExpiredSignatureError:
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Token has been revoked"
+                    detail="Token has expired"
                 )
-            
-            payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
-            return payload
-            
-        except jwt.ExpiredSignatureError:
+            except jwt.InvalidTokenError:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Invalid token"
+                )
+            self._payload_cache[cache_key] = payload
+        elif payload.get("exp", 0) <= time.time():
+            self._payload_cache.pop(cache_key, None)
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Token has expired"
             )
-        except JWTError:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid token"
+        
+        # Check if token is blacklisted
+        jti = payload.get("jti")
+        if jti and jti not in self._blacklist_cache:
+            if await redis_client.get(f"blacklist:{jti}"):
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Token has been revoked"
+                )
+            self._blacklist_cache[jti] = True
+        
+        return payload
+    
+    async def decode_tokens_batch(self, tokens: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Decode several tokens with a single blacklist round-trip.
+        Returns a payload per token, or None where it is invalid or revoked.
+        """
+        payloads: List[Optional[Dict[str, Any]]] = []
+        for token in tokens:
+            cache_key = self._token_cache_key(token)
+            payload = self._payload_cache.get(cache_key)
+            if payload is None:
+                try:
+                    payload = self._decode_jwt(token)
+                except jwt.InvalidTokenError:
+                    payloads.append(None)
+                    continue
+                self._payload_cache[cache_key] = payload
+            elif payload.get("exp", 0) <= time.time():
+                self._payload_cache.pop(cache_key, None)
+                payload = None
+            payloads.append(payload)
+        
+        # Only ask Redis about JTIs not recently confirmed clean
+        pending = [
+            i for i, payload in enumerate(payloads)
+            if payload and payload.get("jti") and payload["jti"] not in self._blacklist_cache
+        ]
+        if pending:
+            revoked = await redis_client.mget(
+                *(f"blacklist:{payloads[i]['jti']}" for i in pending)
             )
+            for i, hit in zip(pending, revoked):
+                if hit:
+                    payloads[i] = None
+                else:
+                    self._blacklist_cache[payloads[i]["jti"]] = True
+        
+        return payloads
     
-    def refresh_access_token(self, refresh_token: str, db: Session) -> TokenPair:
+    async def refresh_access_token(self, refresh_token: str, db: AsyncSession) -> TokenPair:
         """
         Refresh access token using refresh token.
-        Implements token rotation for enhanced security.
-        """
-        # Validate refresh token
-        token_record = db.query(RefreshToken).filter(
-            RefreshToken.token == refresh_token,
-            RefreshToken.revoked == False,
-            RefreshToken.expires_at > datetime.now(timezone.utc)
-        ).first()
+        Implements token rotation for enhanced security. The replacement
+        token is always stored inline, never deferred.
+        """
+        # Revoke the presented token and load its user in one statement, so
+        # a replayed token can only ever win once
+        token_hash = _hash_token(refresh_token)
+        if token_hash is not None and await self._possibly_rotated(token_hash):
+            await self._check_refresh_token_reuse(db, token_hash)
+        
+        if token_hash is None:
+            user = None
+        elif db.bind.dialect.name == "postgresql":
+            result = await db.execute(
+                select(User).from_statement(_ROTATE_REFRESH_TOKEN_SQL),
+                {"token_hash": token_hash}
+            )
+            user = result.scalar_one_or_none()
+        else:
+            now = datetime.now(timezone.utc)
+            user_id = await db.scalar(
+                update(RefreshToken)
+                .where(
+                    RefreshToken.token_hash == token_hash,
+                    RefreshToken.revoked == False,
+                    RefreshToken.expires_at > now
+                )
+                .values(revoked=True, revoked_at=now)
+                .returning(RefreshToken.user_id)
+            )
+            user = await db.scalar(
+                _CURRENT_USER_QUERY.where(User.is_active == True),
+                {"user_id": user_id}
+            ) if user_id else None
         
-        if not token_record:
+        if user is None:
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid or expired refresh token"
             )
+        # Insert the replacement in the same transaction as the revoke, so
+        # the old token is only retired if the new one is stored
+        token, new_token_hash, expires_at = self._generate_refresh_token()
+        db.add(_new_refresh_token(new_token_hash, token[:8], str(user.id), expires_at))
+        access_token = self.create_access_token(self._token_data(user))
+        await db.commit()
+        await self._mark_rotated(token_hash)
         
-        # Get user
-        user = db.query(User).filter(User.id == token_record.user_id).first()
-        if not user or not user.is_active:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="User not found or inactive"
+        return TokenPair(
+            access_token=access_token,
+            refresh_token=token,
+            expires_in=self.access_token_expire_minutes * 60
+        )
+    
+    async def _possibly_rotated(self, token_hash: bytes) -> bool:
+        """Bloom filter lookup; False means the token was never rotated out"""
+        pipe = redis_client.pipeline(transaction=False)
+        for position in _revoked_filter_positions(token_hash):
+            pipe.getbit(_REVOKED_FILTER_KEY, position)
+        return all(await pipe.execute())
+    
+    async def _mark_rotated(self, token_hash: bytes) -> None:
+        """Add a rotated-out refresh token to the Bloom filter"""
+        pipe = redis_client.pipeline(transaction=False)
+        for position in _revoked_filter_positions(token_hash):
+            pipe.setbit(_REVOKED_FILTER_KEY, position, 1)
+        await pipe.execute()
+    
+    async def _check_refresh_token_reuse(self, db: AsyncSession, token_hash: bytes) -> None:
+        """
+        Confirm a Bloom filter hit. A revoked token being presented again
+        means it was stolen or replayed, so every session for that user is
+        revoked and the request is rejected.
+        """
+        user_id = await db.scalar(
+            select(RefreshToken.user_id).where(
+                RefreshToken.token_hash == token_hash,
+                RefreshToken.revoked == True
+            )
+        )
+        if user_id is None:
+            return  # false positive
+        
+        logger.warning("Refresh token reuse detected for user %s", user_id)
+        await AsyncUserRepository.revoke_all_refresh_tokens(db, user_id)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired refresh token"
+        )
+    
+    async def rebuild_revoked_filter(self) -> None:
+        """
+        Rebuild the Bloom filter from unexpired revoked tokens, dropping
+        expired entries so the false-positive rate stays bounded.
+        """
+        scan_started = datetime.now(timezone.utc)
+        bits = bytearray(_REVOKED_FILTER_BITS // 8)
+        async with AsyncSessionLocal() as db:
+            result = await db.stream_scalars(
+                select(RefreshToken.token_hash).where(
+                    RefreshToken.revoked == True,
+                    RefreshToken.expires_at > datetime.now(timezone.utc)
+                )
             )
+            async for token_hash in result:
+                for position in _revoked_filter_positions(token_hash):
+                    # Redis bit offsets count from the most significant bit
+                    bits[position >> 3] |= 0x80 >> (position & 7)
         
-        # Revoke old refresh token (rotation)
-        token_record.revoked = True
-        token_record.revoked_at = datetime.now(timezone.utc)
-        db.commit()
+        # Per-run staging key, so an overlapping rebuild can't clobber it
+        staging_key = f"{_REVOKED_FILTER_KEY}:rebuild:{secrets.token_hex(8)}"
+        await redis_client.set(staging_key, bytes(bits))
+        await redis_client.rename(staging_key, _REVOKED_FILTER_KEY)
         
-        # Create new token pair
-        return self.create_token_pair(user, db)
+        # Bits other workers set on the old filter during the scan were lost
+        # by the rename, so re-apply every revocation since the scan began
+        async with AsyncSessionLocal() as db:
+            result = await db.stream_scalars(
+                select(RefreshToken.token_hash).where(
+                    RefreshToken.revoked == True,
+                    RefreshToken.revoked_at >= scan_started - _REVOKED_FILTER_REBUILD_SLACK
+                )
+            )
+            pipe = redis_client.pipeline(transaction=False)
+            async for token_hash in result:
+                for position in _revoked_filter_positions(token_hash):
+                    pipe.setbit(_REVOKED_FILTER_KEY, position, 1)
+            await pipe.execute()
     
-    def revoke_token(self, token: str, token_type: str = "access") -> None:
+    async def revoke_token(self, token: str, token_type: str = "access") -> None:
         """
         Revoke token by adding to blacklist.
         Supports both access and refresh token revocation.
@@ -194,31 +675,62 @@ class AuthHandler:
             if jti:
                 # Add to Redis blacklist with TTL matching token expiry
                 ttl = self.access_token_expire_minutes * 60
-                redis_client.setex(f"blacklist:{jti}", ttl, "1")
+                await redis_client.setex(f"blacklist:{jti}", ttl, "1")
+                self._blacklist_cache.pop(jti, None)
+            self._payload_cache.pop(self._token_cache_key(token), None)
         elif token_type == "refresh":
             # Handled in database during refresh operation
             pass
     
+    @staticmethod
+    def _token_cache_key(token: str) -> bytes:
+        """Short fixed-size cache key for a raw token"""
+        return hashlib.blake2b(token.encode(), digest_size=16).digest()
+    
     def _extract_jti(self, token: str) -> Optional[str]:
         """Extract JWT ID from token without full validation"""
+        # Verified tokens are already cached, so skip parsing entirely
+        cached = self._payload_cache.get(self._token_cache_key(token))
+        if cached is not None:
+            return cached.get("jti")
         try:
-            # Decode without verification to get JTI
-            payload = jwt.decode(token, options={"verify_signature": False})
-            return payload.get("jti")
-        except:
+            # Decode the payload segment directly; no signature or claim checks
+            segment = token.split(".", 2)[1]
+            padding = "=" * (-len(segment) % 4)
+            return orjson.loads(base64.urlsafe_b64decode(segment + padding)).get("jti")
+        except Exception:
             return None
-    
+
+    def token_user_id(self, token: str) -> Optional[str]:
+        """
+        User id of a valid token, for attribution only (audit logging).
+        Shares the verified payload cache with decode_token, so the route's
+        auth dependency reuses this verification, but skips the blacklist
+        lookup; routes still reject revoked tokens. None if invalid.
+        """
+        cache_key = self._token_cache_key(token)
+        payload = self._payload_cache.get(cache_key)
+        if payload is None:
+            try:
+                payload = self._decode_jwt(token)
+            except jwt.InvalidTokenError:
+                return None
+            self._payload_cache[cache_key] = payload
+        elif payload.get("exp", 0) <= time.time():
+            return None
+        return payload.get("user_id")
+
     async def get_current_user(
         self, 
         credentials: HTTPAuthorizationCredentials = Depends(security),
-        db: Session = Depends(get_db)
-    ) -> User:
+        db: AsyncSession = Depends(get_async_db)
+    ) -> CurrentUser:
         """
         FastAPI dependency to get current authenticated user.
-        Validates token and retrieves user from database.
+        Validates token and returns a snapshot of the user's row.
         """
         token = credentials.credentials
-        payload = self.decode_token(token)
+        payload = await self.decode_token(token)
         
         user_id = payload.get("user_id")
         if not user_id:
@@ -227,7 +739,20 @@ class AuthHandler:
                 detail="Invalid token payload"
             )
         
-        user = db.query(User).filter(User.id == user_id).first()
+        user = None
+        cached = self._user_cache.get(user_id)
+        if cached is not None:
+            # Another worker may have deactivated the user or changed roles
+            user, loaded_at = cached
+            invalidated_at = await redis_client.get(f"user_invalidated:{user_id}")
+            if invalidated_at and loaded_at <= float(invalidated_at):
+                user = None
+        if user is None:
+            loaded_at = time.time()
+            row = await db.scalar(_CURRENT_USER_QUERY, {"user_id": user_id})
+            if row is not None:
+                user = CurrentUser.from_user(row)
+                self._user_cache[user_id] = (user, loaded_at)
         if not user or not user.is_active:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -236,10 +761,51 @@ class AuthHandler:
         
         return user
     
+    async def get_claims_user(
+        self,
+        credentials: HTTPAuthorizationCredentials = Depends(security)
+    ) -> ClaimsUser:
+        """
+        FastAPI dependency for endpoints that only need identity and roles.
+        Trusts the signed claims instead of loading the User row.
+        """
+        payload = await self.decode_token(credentials.credentials)
+        
+        user_id = payload.get("user_id")
+        if not user_id or not payload.get("is_active", True):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found or inactive"
+            )
+        
+        # Tokens issued before a deactivation or role change are stale
+        invalidated_at = await redis_client.get(f"user_invalidated:{user_id}")
+        if invalidated_at and payload.get("iat", 0) <= float(invalidated_at):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token claims are no longer valid"
+            )
+        
+        return ClaimsUser(
+            id=user_id,
+            email=payload.get("email", ""),
+            roles=payload.get("roles", []),
+            is_active=True
+        )
+    
+    async def invalidate_user_claims(self, user_id: str) -> None:
+        """Reject claims-only auth for tokens issued before now"""
+        self._user_cache.pop(user_id, None)
+        await redis_client.setex(
+            f"user_invalidated:{user_id}",
+            self.access_token_expire_minutes * 60,
+            str(time.time())
+        )
+    
     async def get_current_active_user(
         self,
-        current_user: User = Depends(get_current_user)
-    ) -> User:
+        current_user: CurrentUser = Depends(get_current_user)
+    ) -> CurrentUser:
         """Ensure user is active"""
         if not current_user.is_active:
             raise HTTPException(
@@ -254,8 +820,8 @@ class AuthHandler:
         Usage: Depends(auth_handler.require_roles(["admin"]))
         """
         async def role_checker(
-            current_user: User = Depends(self.get_current_active_user)
-        ) -> User:
+            current_user: CurrentUser = Depends(self.get_current_active_user)
+        ) -> CurrentUser:
             user_roles = set(current_user.roles or [])
             if not any(role in user_roles for role in required_roles):
                 raise HTTPException(
@@ -272,28 +838,64 @@ auth_handler = AuthHandler()
 # Rate limiting decorator
 def rate_limit(max_requests: int = 5, window_seconds: int = 60):
     """
-    Rate limiting decorator using Redis.
+    Sliding-window rate limiting decorator using Redis.
     Prevents brute force attacks on authentication endpoints.
+    Sets X-RateLimit-* headers when the endpoint takes a Response.
     """
+    window_ms = window_seconds * 1000
+    
     def decorator(func):
+        @functools.wraps(func)
         async def wrapper(request: Request, *args, **kwargs):
-            client_ip = request.client.host
-            key = f"rate_limit:{func.__name__}:{client_ip}"
+            # Key per route and client, narrowed to the user when known
+            key = f"rl:{func.__name__}:{request.client.host}"
+            user_id = getattr(request.state, "user_id", None)
+            if user_id:
+                key = f"{key}:{user_id}"
             
-            current = redis_client.get(key)
-            if current and int(current) >= max_requests:
+            now_ms = int(time.time() * 1000)
+            allowed, remaining, reset_ms = await _RATE_LIMIT_SCRIPT(
+                keys=[key],
+                args=[now_ms, window_ms, max_requests, f"{now_ms}:{secrets.token_hex(4)}"]
+            )
+            headers = {
+                "X-RateLimit-Limit": str(max_requests),
+                "X-RateLimit-Remaining": str(max(remaining, 0)),
+                "X-RateLimit-Reset": str(-(-reset_ms // 1000))  # seconds, rounded up
+            }
+            if not allowed:
                 raise HTTPException(
                     status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                    detail="Too many requests. Please try again later."
+                    detail="Too many requests. Please try again later.",
+                    headers={**headers, "Retry-After": headers["X-RateLimit-Reset"]}
                 )
             
-            # Increment counter
-            pipe = redis_client.pipeline()
-            pipe.incr(key)
-            pipe.expire(key, window_seconds)
-            pipe.execute()
+            response = kwargs.get("response")
+            if isinstance(response, Response):
+                response.headers.update(headers)
             
             return await func(request, *args, **kwargs)
         
         return wrapper
     return decorator
+
+def gcra_limit(name: str, emission_interval_ms: int, burst_tolerance_ms: int):
+    """
+    Dependency factory for GCRA rate limiting (O(1) Redis state per key).
+    Runs before the endpoint body, so floods are rejected before any
+    password hashing.
+    """
+    async def limiter(request: Request) -> None:
+        key = f"gcra:{name}:{request.client.host}"
+        allowed, retry_ms = await _GCRA_SCRIPT(
+            keys=[key],
+            args=[int(time.time() * 1000), emission_interval_ms, burst_tolerance_ms]
+        )
+        if not allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests. Please try again later.",
+                headers={"Retry-After": str(-(-retry_ms // 1000))}
+            )
+    
+    return limiter
@@ -3,62 +3,135 @@ Authentication API endpoints with comprehensive security measures.
 Implements OWASP authentication best practices.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status, Request, Response
+from fastapi.responses import ORJSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timezone
-from pydantic import BaseModel, EmailStr, Field, validator
-from typing import Optional
-import re
+from pydantic import AfterValidator, BaseModel, ConfigDict, EmailStr, Field, field_validator
+from typing import Annotated, Optional
+import asyncio
+import base64
+import hashlib
 import logging
+import re
+import orjson
 
-from .auth_handler import auth_handler, rate_limit
-from ..models.database import User
-from ..models.repositories import UserRepository
-from ..utils.db_manager import get_db
+from .auth_handler import auth_handler, rate_limit, gcra_limit, redis_client, CurrentUser
+from .user_repository import AsyncUserRepository
+from ..utils.db_manager import AsyncSessionLocal, get_async_db
 from ..utils.email_service import send_verification_email, send_password_reset_email
-from ..config import settings
+from ..config import settings, REFRESH_TOKEN_EXPIRE_SECONDS, COOKIE_SECURE
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/auth", tags=["authentication"])
 
+# Refresh cookie attributes never change for the life of the process
+_REFRESH_COOKIE_PATH = "/api/auth/refresh"
+_SET_REFRESH_COOKIE_KW = dict(
+    key="refresh_token",
+    max_age=REFRESH_TOKEN_EXPIRE_SECONDS,
+    httponly=True,
+    secure=COOKIE_SECURE,
+    samesite="lax",
+    path=_REFRESH_COOKIE_PATH
+)
+
+# Password character classes, looked up per byte in a single pass
+_PW_UPPER, _PW_LOWER, _PW_DIGIT, _PW_SPECIAL = 1, 2, 4, 8
+_PW_ALL = _PW_UPPER | _PW_LOWER | _PW_DIGIT | _PW_SPECIAL
+
+def _build_password_class_table() -> bytes:
+    table = bytearray(256)
+    for c in b"ABCDEFGHIJKLMNOPQRSTUVWXYZ":
+        table[c] = _PW_UPPER
+    for c in b"abcdefghijklmnopqrstuvwxyz":
+        table[c] = _PW_LOWER
+    for c in b"0123456789":
+        table[c] = _PW_DIGIT
+    for c in b'!@#$%^&*(),.?":{}|<>':
+        table[c] = _PW_SPECIAL
+    return bytes(table)
+
+_PW_CLASS = _build_password_class_table()
+
+# Cheap syntax check for lookup-only emails; full email-validator checks
+# are kept for registration, where the address gets stored
+_EMAIL_RE = re.compile(r"^[A-Za-z0-9._%+\-]+@[A-Za-z0-9.\-]+\.[A-Za-z]{2,}$", re.ASCII)
+
+def _normalize_email(v: str) -> str:
+    if not _EMAIL_RE.match(v):
+        raise ValueError('Invalid email address')
+    return v.lower()
+
+FastEmail = Annotated[str, AfterValidator(_normalize_email)]
+
+# Request bodies: schemas are built at class creation (not on first use),
+# no per-assignment validation, unknown fields rejected. Whitespace is left
+# alone since every request model carries a password or token.
+_REQUEST_MODEL_CONFIG = ConfigDict(
+    defer_build=False,
+    validate_assignment=False,
+    extra='forbid'
+)
+
 # Request/Response Models
 class UserRegister(BaseModel):
     """User registration request with validation"""
+    model_config = _REQUEST_MODEL_CONFIG
+    
     email: EmailStr
     password: str = Field(..., min_length=8, max_length=128)
     full_name: str = Field(..., min_length=2, max_length=100)
     
-    @validator('password')
+    @field_validator('email')
+    @classmethod
+    def lowercase_email(cls, v):
+        """Store emails lowercased so lookups are a plain index probe"""
+        return v.lower()
+    
+    @field_validator('password')
+    @classmethod
     def validate_password(cls, v):
         """Enforce password complexity requirements"""
-        if not re.search(r'[A-Z]', v):
+        mask = 0
+        for b in v.encode('utf-8'):
+            mask |= _PW_CLASS[b]
+        if mask == _PW_ALL:
+            return v
+        if not mask & _PW_UPPER:
             raise ValueError('Password must contain at least one uppercase letter')
-        if not re.search(r'[a-z]', v):
+        if not mask & _PW_LOWER:
             raise ValueError('Password must contain at least one lowercase letter')
-        if not re.search(r'\d', v):
+        if not mask & _PW_DIGIT:
             raise ValueError('Password must contain at least one digit')
-        if not re.search(r'[!@#$%^&*(),.?":{}|<>]', v):
-            raise ValueError('Password must contain at least one special character')
-        return v
+        raise ValueError('Password must contain at least one special character')
 
 class UserLogin(BaseModel):
     """User login request"""
-    email: EmailStr
+    model_config = _REQUEST_MODEL_CONFIG
+    
+    email: FastEmail
     password: str
 
 class TokenRefresh(BaseModel):
     """Token refresh request"""
+    model_config = _REQUEST_MODEL_CONFIG
+    
     refresh_token: str
 
 class PasswordReset(BaseModel):
     """Password reset request"""
+    model_config = _REQUEST_MODEL_CONFIG
+    
     token: str
     new_password: str = Field(..., min_length=8, max_length=128)
 
 class UserResponse(BaseModel):
-    """User response model"""
+    """User response model, validated straight from a User row or CurrentUser"""
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+    
     id: str
     email: str
     full_name: str
@@ -66,28 +139,62 @@ class UserResponse(BaseModel):
     roles: list[str]
     created_at: datetime
 
+class UserPage(BaseModel):
+    """One page of the admin user list"""
+    users: list[UserResponse]
+    next_cursor: Optional[str] = None
+
+def _encode_user_cursor(created_at: datetime, user_id) -> str:
+    """Opaque cursor pointing just past a (created_at, id) row"""
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{user_id}".encode()).decode()
+
+def _decode_user_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        created_at, user_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(created_at), user_id
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+async def _upgrade_password_hash(user_id: str, password: str):
+    """Re-hash a just-verified password with the current argon2 parameters"""
+    hashed_password = await auth_handler.get_password_hash(password)
+    async with AsyncSessionLocal() as db:
+        await AsyncUserRepository.update_password(db, user_id, hashed_password)
+
 @router.post("/register", response_model=UserResponse)
 @rate_limit(max_requests=5, window_seconds=300)  # 5 registrations per 5 minutes
 async def register(
     request: Request,
     user_data: UserRegister,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Register a new user account.
     Implements email verification workflow.
     """
-    # Check if user exists
-    existing_user = UserRepository.get_user_by_email(db, user_data.email)
+    # Start hashing on the hashing pool while the email lookup runs; on
+    # the usual "email not taken" path the lookup is hidden behind the hash
+    hash_task = asyncio.create_task(auth_handler.get_password_hash(user_data.password))
+    
+    # Check if user exists; don't leave the hash running if the lookup fails
+    try:
+        existing_user = await AsyncUserRepository.get_user_by_email(db, user_data.email)
+    except BaseException:
+        hash_task.cancel()
+        raise
     if existing_user:
+        hash_task.cancel()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="User with this email already exists"
         )
     
     # Create user
-    hashed_password = auth_handler.get_password_hash(user_data.password)
-    user = UserRepository.create_user(db, {
+    hashed_password = await hash_task
+    user = await AsyncUserRepository.create_user(db, {
         "email": user_data.email,
         "full_name": user_data.full_name,
         "hashed_password": hashed_password,
@@ -95,41 +202,39 @@ async def register(
         "roles": ["user"]
     })
     
-    # Send verification email
+    # Queue verification email (sent by the background mail worker)
     try:
         await send_verification_email(user.email, user.id)
     except Exception as e:
-        logger.error(f"Failed to send verification email: {e}")
+        logger.error("Failed to send verification email: %s", e)
         # Don't fail registration, but log the error
     
-    logger.info(f"New user registered: {user.email}")
+    logger.info("New user registered: %s", user.email)
     
-    return UserResponse(
-        id=str(user.id),
-        email=user.email,
-        full_name=user.full_name,
-        is_active=user.is_active,
-        roles=user.roles,
-        created_at=user.created_at
-    )
+    return UserResponse.model_validate(user)
 
-@router.post("/login")
-@rate_limit(max_requests=10, window_seconds=60)  # 10 login attempts per minute
+@router.post("/login", dependencies=[Depends(gcra_limit(
+    "login",
+    emission_interval_ms=settings.LOGIN_EMISSION_INTERVAL_MS,
+    burst_tolerance_ms=settings.LOGIN_BURST_TOLERANCE_MS
+))])  # 10 login attempts per minute, bursts of 5
 async def login(
     request: Request,
     response: Response,
+    background_tasks: BackgroundTasks,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Authenticate user and return token pair.
     Sets secure HTTP-only cookie for refresh token.
     """
     # Validate credentials
-    user = UserRepository.get_user_by_email(db, form_data.username)  # OAuth2 uses 'username'
-    if not user or not auth_handler.verify_password(form_data.password, user.hashed_password):
+    # OAuth2 uses 'username'; emails are stored lowercased
+    user = await AsyncUserRepository.get_user_by_email(db, form_data.username.lower())
+    if not user or not await auth_handler.verify_password(form_data.password, user.hashed_password):
         # Log failed attempt
-        logger.warning(f"Failed login attempt for: {form_data.username}")
+        logger.warning("Failed login attempt for: %s", form_data.username)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password"
@@ -141,24 +246,17 @@ async def login(
             detail="Account not activated. Please check your email."
         )
     
-    # Generate tokens
-    token_pair = auth_handler.create_token_pair(user, db)
+    # Migrate bcrypt / outdated argon2 hashes lazily, after the response
+    if auth_handler.password_needs_rehash(user.hashed_password):
+        background_tasks.add_task(_upgrade_password_hash, user.id, form_data.password)
     
-    # Set refresh token as HTTP-only cookie
-    response.set_cookie(
-        key="refresh_token",
-        value=token_pair.refresh_token,
-        max_age=settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60,
-        httponly=True,
-        secure=settings.ENVIRONMENT == "production",  # HTTPS only in production
-        samesite="lax",
-        path="/api/auth/refresh"
-    )
+    # Generate tokens; also records last login in the same statement
+    token_pair = await auth_handler.create_login_token_pair(user, db)
     
-    # Update last login
-    UserRepository.update_last_login(db, user.id)
+    # Set refresh token as HTTP-only cookie
+    response.set_cookie(value=token_pair.refresh_token, **_SET_REFRESH_COOKIE_KW)
     
-    logger.info(f"User logged in: {user.email}")
+    logger.info("User logged in: %s", user.email)
     
     return {
         "access_token": token_pair.access_token,
@@ -176,7 +274,7 @@ async def login(
 async def refresh_token(
     request: Request,
     response: Response,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Refresh access token using refresh token from cookie.
@@ -192,18 +290,10 @@ async def refresh_token(
     
     try:
         # Get new token pair
-        token_pair = auth_handler.refresh_access_token(refresh_token, db)
+        token_pair = await auth_handler.refresh_access_token(refresh_token, db)
         
         # Update refresh token cookie
-        response.set_cookie(
-            key="refresh_token",
-            value=token_pair.refresh_token,
-            max_age=settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60,
-            httponly=True,
-            secure=settings.ENVIRONMENT == "production",
-            samesite="lax",
-            path="/api/auth/refresh"
-        )
+        response.set_cookie(value=token_pair.refresh_token, **_SET_REFRESH_COOKIE_KW)
         
         return {
             "access_token": token_pair.access_token,
@@ -213,51 +303,65 @@ async def refresh_token(
         
     except HTTPException:
         # Clear invalid cookie
-        response.delete_cookie("refresh_token", path="/api/auth/refresh")
+        response.delete_cookie("refresh_token", path=_REFRESH_COOKIE_PATH)
         raise
 
 @router.post("/logout")
 async def logout(
     response: Response,
-    current_user: User = Depends(auth_handler.get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(auth_handler.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Logout user by revoking tokens and clearing cookies.
     """
     # Clear refresh token cookie
-    response.delete_cookie("refresh_token", path="/api/auth/refresh")
+    response.delete_cookie("refresh_token", path=_REFRESH_COOKIE_PATH)
     
     # Revoke all user's refresh tokens in database
-    UserRepository.revoke_all_refresh_tokens(db, current_user.id)
+    await AsyncUserRepository.revoke_all_refresh_tokens(db, current_user.id)
     
-    logger.info(f"User logged out: {current_user.email}")
+    logger.info("User logged out: %s", current_user.email)
     
     return {"message": "Successfully logged out"}
 
 @router.get("/me", response_model=UserResponse)
 async def get_current_user(
-    current_user: User = Depends(auth_handler.get_current_user)
+    request: Request,
+    current_user: CurrentUser = Depends(auth_handler.get_current_user)
 ):
-    """Get current authenticated user information"""
-    return UserResponse(
-        id=str(current_user.id),
-        email=current_user.email,
-        full_name=current_user.full_name,
-        is_active=current_user.is_active,
-        roles=current_user.roles,
-        created_at=current_user.created_at
-    )
+    """
+    Get current authenticated user information.
+    Revalidates with an ETag derived from updated_at; the encoded body is
+    cached in Redis briefly per user version.
+    """
+    version = current_user.updated_at or current_user.created_at
+    etag = '"' + hashlib.blake2b(
+        f"{current_user.id}:{version.timestamp() if version else 0}".encode(),
+        digest_size=8
+    ).hexdigest() + '"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    
+    cache_key = f"me:{current_user.id}:{etag}"
+    body = await redis_client.get(cache_key)
+    if body is None:
+        body = orjson.dumps(
+            UserResponse.model_validate(current_user).model_dump(mode="json")
+        ).decode()
+        await redis_client.set(cache_key, body, ex=30)
+    
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
 
 @router.post("/verify-email/{token}")
 async def verify_email(
     token: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Verify user email address"""
     # Decode verification token
     try:
-        payload = auth_handler.decode_token(token)
+        payload = await auth_handler.decode_token(token)
         user_id = payload.get("user_id")
         if not user_id or payload.get("type") != "email_verification":
             raise HTTPException(
@@ -271,7 +375,7 @@ async def verify_email(
         )
     
     # Activate user
-    user = UserRepository.get_user_by_id(db, user_id)
+    user = await AsyncUserRepository.get_user_by_id(db, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -281,8 +385,8 @@ async def verify_email(
     if user.is_active:
         return {"message": "Email already verified"}
     
-    UserRepository.activate_user(db, user_id)
-    logger.info(f"Email verified for user: {user.email}")
+    await AsyncUserRepository.activate_user(db, user_id)
+    logger.info("Email verified for user: %s", user.email)
     
     return {"message": "Email successfully verified"}
 
@@ -290,29 +394,29 @@ async def verify_email(
 @rate_limit(max_requests=3, window_seconds=300)  # 3 requests per 5 minutes
 async def request_password_reset(
     request: Request,
-    email: EmailStr,
-    db: Session = Depends(get_db)
+    email: FastEmail,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Request password reset email"""
-    user = UserRepository.get_user_by_email(db, email)
+    user = await AsyncUserRepository.get_user_by_email(db, email)
     
     # Don't reveal if user exists
     if user:
         try:
             await send_password_reset_email(user.email, user.id)
         except Exception as e:
-            logger.error(f"Failed to send password reset email: {e}")
+            logger.error("Failed to send password reset email: %s", e)
     
     return {"message": "If the email exists, a password reset link has been sent"}
 
 @router.post("/reset-password")
 async def reset_password(
     reset_data: PasswordReset,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Reset user password with token"""
     try:
-        payload = auth_handler.decode_token(reset_data.token)
+        payload = await auth_handler.decode_token(reset_data.token)
         user_id = payload.get("user_id")
         if not user_id or payload.get("type") != "password_reset":
             raise HTTPException(
@@ -326,13 +430,14 @@ async def reset_password(
         )
     
     # Update password
-    hashed_password = auth_handler.get_password_hash(reset_data.new_password)
-    UserRepository.update_password(db, user_id, hashed_password)
+    hashed_password = await auth_handler.get_password_hash(reset_data.new_password)
+    await AsyncUserRepository.update_password(db, user_id, hashed_password)
     
     # Revoke all refresh tokens for security
-    UserRepository.revoke_all_refresh_tokens(db, user_id)
+    await AsyncUserRepository.revoke_all_refresh_tokens(db, user_id)
+    await auth_handler.invalidate_user_claims(user_id)
     
-    logger.info(f"Password reset for user ID: {user_id}")
+    logger.info("Password reset for user ID: %s", user_id)
     
     return {"message": "Password successfully reset"}
 
@@ -340,63 +445,79 @@ async def reset_password(
 async def change_password(
     current_password: str,
     new_password: str = Field(..., min_length=8, max_length=128),
-    current_user: User = Depends(auth_handler.get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(auth_handler.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Change password for authenticated user"""
-    # Verify current password
-    if not auth_handler.verify_password(current_password, current_user.hashed_password):
+    # Verify current password (not among the columns get_current_user loads)
+    hashed_password = await AsyncUserRepository.get_hashed_password(db, current_user.id)
+    if not await auth_handler.verify_password(current_password, hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect"
         )
     
     # Update password
-    hashed_password = auth_handler.get_password_hash(new_password)
-    UserRepository.update_password(db, current_user.id, hashed_password)
+    hashed_password = await auth_handler.get_password_hash(new_password)
+    await AsyncUserRepository.update_password(db, current_user.id, hashed_password)
     
-    logger.info(f"Password changed for user: {current_user.email}")
+    logger.info("Password changed for user: %s", current_user.email)
     
     return {"message": "Password successfully changed"}
 
 # Admin endpoints
-@router.get("/users", response_model=list[UserResponse])
+@router.get("/users", response_model=UserPage, response_class=ORJSONResponse)
 async def list_users(
-    skip: int = 0,
-    limit: int = 100,
-    current_user: User = Depends(auth_handler.require_roles(["admin"])),
-    db: Session = Depends(get_db)
+    after: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    current_user: CurrentUser = Depends(auth_handler.require_roles(["admin"])),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """List all users (admin only)"""
-    users = UserRepository.get_users(db, skip=skip, limit=limit)
-    return [
-        UserResponse(
-            id=str(user.id),
-            email=user.email,
-            full_name=user.full_name,
-            is_active=user.is_active,
-            roles=user.roles,
-            created_at=user.created_at
-        )
-        for user in users
-    ]
+    """
+    List users, newest first (admin only).
+    Pass the returned next_cursor as `after` to fetch the following page.
+    """
+    cursor = _decode_user_cursor(after) if after else None
+    
+    # Rows go straight to orjson, skipping per-user model construction
+    rows = await AsyncUserRepository.get_user_rows(db, after=cursor, limit=limit)
+    next_cursor = None
+    if rows and len(rows) == limit:
+        last = rows[-1]
+        next_cursor = _encode_user_cursor(last.created_at, last.id)
+    
+    return ORJSONResponse({
+        "users": [
+            {
+                "id": str(user_id),
+                "email": email,
+                "full_name": full_name,
+                "is_active": is_active,
+                "roles": roles,
+                "created_at": created_at
+            }
+            for user_id, email, full_name, is_active, roles, created_at in rows
+        ],
+        "next_cursor": next_cursor
+    })
 
 @router.put("/users/{user_id}/roles")
 async def update_user_roles(
     user_id: str,
     roles: list[str],
-    current_user: User = Depends(auth_handler.require_roles(["admin"])),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(auth_handler.require_roles(["admin"])),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update user roles (admin only)"""
-    user = UserRepository.get_user_by_id(db, user_id)
+    user = await AsyncUserRepository.get_user_by_id(db, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    UserRepository.update_roles(db, user_id, roles)
-    logger.info(f"Roles updated for user {user.email} by admin {current_user.email}")
+    await AsyncUserRepository.update_roles(db, user_id, roles)
+    await auth_handler.invalidate_user_claims(user_id)
+    logger.info("Roles updated for user %s by admin %s", user.email, current_user.email)
     
     return {"message": "Roles updated successfully"}
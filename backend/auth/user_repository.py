@@ -0,0 +1,139 @@
+"""
+Async user data access for the authentication endpoints.
+Mirrors the UserRepository operations the auth routes need, on AsyncSession.
+"""
+
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, text, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.database import User, RefreshToken
+from ..utils.ids import uuid7
+
+# Record a successful login in one round-trip: bump last_login_at and
+# insert the new refresh token together
+_RECORD_LOGIN_SQL = text("""
+    WITH upd AS (
+        UPDATE users SET last_login_at = now() WHERE id = :user_id
+    )
+    INSERT INTO refresh_tokens
+        (id, token_hash, token_prefix, user_id, created_at, expires_at, revoked)
+    VALUES
+        (:id, :token_hash, :token_prefix, :user_id, now(), :expires_at, false)
+""")
+
+
+class AsyncUserRepository:
+    """User queries and updates that don't block the event loop"""
+
+    @staticmethod
+    async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
+        result = await db.execute(select(User).where(User.email == email))
+        return result.scalar_one_or_none()
+
+    @staticmethod
+    async def get_user_by_id(db: AsyncSession, user_id: str) -> Optional[User]:
+        return await db.get(User, user_id)
+
+    @staticmethod
+    async def get_user_rows(
+        db: AsyncSession,
+        after: Optional[Tuple[datetime, str]] = None,
+        limit: int = 100
+    ):
+        """
+        Public user columns as plain rows, without hydrating ORM objects.
+        Newest first, keyset-paginated on (created_at, id): pass the last
+        row's (created_at, id) as `after` to get the next page.
+        """
+        query = select(
+            User.id, User.email, User.full_name,
+            User.is_active, User.roles, User.created_at
+        ).order_by(User.created_at.desc(), User.id.desc()).limit(limit)
+        if after is not None:
+            query = query.where(tuple_(User.created_at, User.id) < tuple_(*after))
+        result = await db.execute(query)
+        return result.all()
+
+    @staticmethod
+    async def get_hashed_password(db: AsyncSession, user_id: str) -> Optional[str]:
+        return await db.scalar(select(User.hashed_password).where(User.id == user_id))
+
+    @staticmethod
+    async def create_user(db: AsyncSession, user_data: Dict[str, Any]) -> User:
+        now = datetime.now(timezone.utc)
+        user = User(id=str(uuid7()), created_at=now, updated_at=now, **user_data)
+        db.add(user)
+        await db.commit()
+        return user
+
+    @staticmethod
+    async def _update_user(db: AsyncSession, user_id: str, values: Dict[str, Any]) -> None:
+        await db.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(updated_at=datetime.now(timezone.utc), **values)
+        )
+        await db.commit()
+
+    @staticmethod
+    async def update_last_login(db: AsyncSession, user_id: str) -> None:
+        await AsyncUserRepository._update_user(
+            db, user_id, {"last_login_at": datetime.now(timezone.utc)}
+        )
+
+    @staticmethod
+    async def activate_user(db: AsyncSession, user_id: str) -> None:
+        await AsyncUserRepository._update_user(
+            db, user_id, {"is_active": True, "is_verified": True}
+        )
+
+    @staticmethod
+    async def update_password(db: AsyncSession, user_id: str, hashed_password: str) -> None:
+        await AsyncUserRepository._update_user(db, user_id, {"hashed_password": hashed_password})
+
+    @staticmethod
+    async def update_roles(db: AsyncSession, user_id: str, roles: List[str]) -> None:
+        await AsyncUserRepository._update_user(db, user_id, {"roles": roles})
+
+    @staticmethod
+    async def revoke_all_refresh_tokens(db: AsyncSession, user_id: str) -> None:
+        await db.execute(
+            update(RefreshToken)
+            .where(RefreshToken.user_id == user_id, RefreshToken.revoked == False)
+            .values(revoked=True, revoked_at=datetime.now(timezone.utc))
+        )
+        await db.commit()
+
+    @staticmethod
+    async def record_login(
+        db: AsyncSession,
+        user_id: str,
+        token_hash: bytes,
+        token_prefix: str,
+        expires_at: datetime
+    ) -> None:
+        """Update last_login_at and store the login's refresh token in one commit"""
+        if db.bind.dialect.name == "postgresql":
+            await db.execute(_RECORD_LOGIN_SQL, {
+                "id": str(uuid7()),
+                "token_hash": token_hash,
+                "token_prefix": token_prefix,
+                "user_id": user_id,
+                "expires_at": expires_at
+            })
+        else:
+            now = datetime.now(timezone.utc)
+            await db.execute(
+                update(User).where(User.id == user_id).values(last_login_at=now)
+            )
+            db.add(RefreshToken(
+                token_hash=token_hash,
+                token_prefix=token_prefix,
+                user_id=user_id,
+                expires_at=expires_at,
+                created_at=now
+            ))
+        await db.commit()
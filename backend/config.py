@@ -3,13 +3,36 @@ Application configuration with security-first defaults.
 Uses environment variables with sensible fallbacks.
 """
 
+import json
 import os
+from dataclasses import dataclass, fields
 from typing import Optional
-from pydantic import BaseSettings, validator
 from pathlib import Path
+from dotenv import load_dotenv
 
-class Settings(BaseSettings):
-    """Application settings with validation"""
+def _parse_bool(value: str) -> bool:
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+def _parse_list(value: str) -> tuple:
+    """Comma-separated values, or a JSON array (the older .env format)"""
+    value = value.strip()
+    if value.startswith("["):
+        return tuple(str(item).strip() for item in json.loads(value) if str(item).strip())
+    return tuple(item.strip() for item in value.split(",") if item.strip())
+
+# How each field type is coerced from its environment string
+_PARSERS = {
+    str: str,
+    Optional[str]: str,
+    int: int,
+    bool: _parse_bool,
+    tuple: _parse_list,
+    Path: Path,
+}
+
+@dataclass(slots=True, frozen=True)
+class Settings:
+    """Application settings, read once from the environment"""
     
     # Application
     APP_NAME: str = "OpenClip Pro"
@@ -21,11 +44,14 @@ class Settings(BaseSettings):
     HOST: str = "0.0.0.0"
     PORT: int = 8000
     WORKERS: int = 4
+    THREADPOOL_SIZE: int = 64  # per worker, for blocking I/O offloaded from the event loop
     
     # Database
     DATABASE_URL: str = "sqlite:///./openclip.db"
-    DATABASE_POOL_SIZE: int = 10
-    DATABASE_MAX_OVERFLOW: int = 20
+    DATABASE_POOL_SIZE: int = 50
+    DATABASE_MAX_OVERFLOW: int = 100
+    DATABASE_POOL_RECYCLE: int = 3600  # seconds
+    DATABASE_QUERY_CACHE_SIZE: int = 1200  # compiled statements kept per engine
     
     # Redis
     REDIS_HOST: str = "localhost"
@@ -34,10 +60,13 @@ class Settings(BaseSettings):
     REDIS_PASSWORD: Optional[str] = None
     
     # Security
-    SECRET_KEY: str = os.getenv("SECRET_KEY", "CHANGE-THIS-IN-PRODUCTION-" + os.urandom(32).hex())
+    SECRET_KEY: str = "CHANGE-THIS-IN-PRODUCTION-" + os.urandom(32).hex()
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 30
+    TOKEN_CACHE_SIZE: int = 10000
+    TOKEN_BLACKLIST_CACHE_SECONDS: int = 30
+    CURRENT_USER_CACHE_SECONDS: int = 5
     
     # Password Policy
     PASSWORD_MIN_LENGTH: int = 8
@@ -46,14 +75,22 @@ class Settings(BaseSettings):
     PASSWORD_REQUIRE_NUMBERS: bool = True
     PASSWORD_REQUIRE_SPECIAL: bool = True
     
+    # Password Hashing (argon2id, OWASP minimums)
+    ARGON2_TIME_COST: int = 2
+    ARGON2_MEMORY_COST: int = 19456  # KiB
+    ARGON2_PARALLELISM: int = 1
+    PASSWORD_HASH_WORKERS: int = os.cpu_count() or 1
+    
     # Rate Limiting
     RATE_LIMIT_ENABLED: bool = True
     RATE_LIMIT_DEFAULT: str = "100/hour"
     RATE_LIMIT_AUTH: str = "10/hour"
     RATE_LIMIT_UPLOAD: str = "50/day"
+    LOGIN_EMISSION_INTERVAL_MS: int = 6000  # sustained rate: 10/minute
+    LOGIN_BURST_TOLERANCE_MS: int = 30000  # allows a burst of 5
     
     # CORS
-    CORS_ORIGINS: list = ["http://localhost:3000", "http://localhost:5173"]
+    CORS_ORIGINS: tuple = ("http://localhost:3000", "http://localhost:5173")
     CORS_ALLOW_CREDENTIALS: bool = True
     
     # File Storage
@@ -61,7 +98,7 @@ class Settings(BaseSettings):
     TEMP_DIR: Path = Path("./temp")
     OUTPUTS_DIR: Path = Path("./outputs")
     MAX_UPLOAD_SIZE: int = 5 * 1024 * 1024 * 1024  # 5GB
-    ALLOWED_VIDEO_EXTENSIONS: list = [".mp4", ".avi", ".mov", ".mkv", ".webm"]
+    ALLOWED_VIDEO_EXTENSIONS: tuple = (".mp4", ".avi", ".mov", ".mkv", ".webm")
     
     # AI Providers
     OPENAI_API_KEY: Optional[str] = None
@@ -77,6 +114,10 @@ class Settings(BaseSettings):
     LMSTUDIO_BASE_URL: str = "http://localhost:1234"
     LMSTUDIO_MODEL: str = "local-model"
     
+    # Video analysis jobs, per worker process
+    ANALYSIS_WORKERS: int = 4  # analyses running at once
+    ANALYSIS_QUEUE_SIZE: int = 100  # accepted analyses waiting for a slot
+    
     # Email
     SMTP_HOST: Optional[str] = None
     SMTP_PORT: int = 587
@@ -104,39 +145,36 @@ class Settings(BaseSettings):
     FREE_TIER_PROJECTS: int = 10
     FREE_TIER_API_CALLS: int = 1000
     
-    @validator("UPLOAD_DIR", "TEMP_DIR", "OUTPUTS_DIR")
-    def create_directories(cls, v):
-        """Ensure directories exist"""
-        path = Path(v)
-        path.mkdir(parents=True, exist_ok=True)
-        return path
-    
-    @validator("DATABASE_URL")
-    def validate_database_url(cls, v, values):
-        """Add async support for SQLite"""
-        if v.startswith("sqlite:///"):
-            # Add check_same_thread=False for SQLite
-            return v + "?check_same_thread=False"
-        return v
-    
-    @validator("SECRET_KEY")
-    def validate_secret_key(cls, v, values):
-        """Ensure secret key is set in production"""
-        if values.get("ENVIRONMENT") == "production" and "CHANGE-THIS" in v:
+    @classmethod
+    def from_env(cls) -> "Settings":
+        """Build settings from os.environ (and .env), then validate"""
+        load_dotenv(".env")
+        values = {}
+        for field in fields(cls):
+            raw = os.environ.get(field.name)
+            if raw is not None:
+                values[field.name] = _PARSERS[field.type](raw)
+        settings = cls(**values)
+        
+        # Ensure secret key is set in production
+        if settings.ENVIRONMENT == "production" and "CHANGE-THIS" in settings.SECRET_KEY:
             raise ValueError("SECRET_KEY must be set in production")
-        return v
-    
-    class Config:
-        env_file = ".env"
-        env_file_encoding = "utf-8"
-        case_sensitive = True
+        
+        # Ensure directories exist
+        for path in (settings.UPLOAD_DIR, settings.TEMP_DIR, settings.OUTPUTS_DIR):
+            path.mkdir(parents=True, exist_ok=True)
+        
+        return settings
 
 # Create settings instance
-settings = Settings()
+settings = Settings.from_env()
 
 # Export commonly used settings
 SECRET_KEY = settings.SECRET_KEY
 DATABASE_URL = settings.DATABASE_URL
+REFRESH_TOKEN_EXPIRE_DAYS = settings.REFRESH_TOKEN_EXPIRE_DAYS
+REFRESH_TOKEN_EXPIRE_SECONDS = REFRESH_TOKEN_EXPIRE_DAYS * 86400
+COOKIE_SECURE = settings.ENVIRONMENT == "production"  # HTTPS-only cookies in production
 REDIS_URL = f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/{settings.REDIS_DB}"
 if settings.REDIS_PASSWORD:
     REDIS_URL = f"redis://:{settings.REDIS_PASSWORD}@{settings.REDIS_HOST}:{settings.REDIS_PORT}/{settings.REDIS_DB}"
@@ -1,37 +1,116 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Depends, Request
+from fastapi import FastAPI, HTTPException, UploadFile, File, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from starlette.datastructures import Headers
+from pydantic import BaseModel, ConfigDict
+from typing import List, Literal, Optional, Dict, Any, Tuple
 import uvicorn
 import os
-import json
+import functools
+import orjson
 import asyncio
 import logging
+import logging.handlers
+import queue
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime
-import uuid
-from sqlalchemy.orm import Session
+from concurrent.futures import ThreadPoolExecutor
+import anyio.to_thread
+from cachetools import TTLCache
+from sqlalchemy import bindparam, func, insert, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 import platform
 import sys
 
 # Import our modules
 from models.project import Project as ProjectSchema, Clip as ClipSchema, AnalysisRequest
-from models.database import Project, Clip, Setting, User
-from models.repositories import ProjectRepository, ClipRepository, SettingsRepository, UserRepository, AuditLogRepository
+from models.database import Project, Clip, Setting, User, AuditLog
+from models.repositories import ProjectRepository, ClipRepository, SettingsRepository, UserRepository
 from services.video_processor import VideoProcessor
 from services.ai_analyzer import AIAnalyzer
 from services.api_manager import APIManager
 from utils.security import SecurityManager
 from utils.file_manager import FileManager
-from utils.db_manager import get_db, init_db
-from auth.auth_handler import auth_handler
+from utils.ids import uuid7
+from utils.db_manager import get_db, get_async_db, get_db_session, init_db, ensure_audit_log_partitions
+from auth.auth_handler import auth_handler, ClaimsUser, CurrentUser, redis_client
 from auth import auth_routes
+from utils.email_service import email_service
 from config import settings
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+_log_listener: Optional[logging.handlers.QueueListener] = None
+
+def start_queue_logging():
+    """
+    Move the root handlers behind a QueueHandler so request code only
+    enqueues records; a listener thread does the actual stream writes.
+    """
+    global _log_listener
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    for handler in handlers:
+        root.removeHandler(handler)
+    log_queue = queue.SimpleQueue()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    _log_listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+    _log_listener.start()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Startup and shutdown. Independent startup work (database setup,
+    provider metadata, storage checks) runs concurrently so the server
+    is ready sooner, and the first /api/providers hit is already cached.
+    """
+    start_queue_logging()
+    configure_thread_pools()
+    
+    await asyncio.gather(
+        _init_database(),
+        asyncio.to_thread(_providers_payload),
+        asyncio.to_thread(_check_storage_dirs)
+    )
+    
+    background_jobs = [
+        asyncio.create_task(audit_flush_job()),
+        *(asyncio.create_task(analysis_worker()) for _ in range(settings.ANALYSIS_WORKERS)),
+        asyncio.create_task(audit_partition_job()),
+        asyncio.create_task(revoked_filter_job())
+    ]
+    await email_service.start()
+    
+    yield
+    
+    for job in background_jobs:
+        job.cancel()
+    # Let cancelled analyses record their failure before the loop stops
+    await asyncio.gather(*background_jobs, return_exceptions=True)
+    try:
+        await asyncio.to_thread(_fail_queued_analyses)
+    except Exception as e:
+        logger.error(f"Failed to mark queued analyses as failed: {e}")
+    # Write audit entries that hadn't been flushed yet
+    remaining = _drain_audit_queue()
+    if remaining:
+        try:
+            await asyncio.to_thread(_write_audit_logs, remaining)
+        except Exception as e:
+            logger.error(f"Failed to write {len(remaining)} audit log entries: {e}")
+    # Send queued verification/reset emails before the loop stops
+    await email_service.stop()
+    await asyncio.gather(ai_analyzer.close(), api_manager.close(), return_exceptions=True)
+    # Flush whatever is still queued
+    if _log_listener is not None:
+        _log_listener.stop()
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -39,7 +118,9 @@ app = FastAPI(
     description="AI-powered video clipping backend with enterprise security",
     version="1.0.0",
     docs_url="/api/docs" if settings.DEBUG else None,
-    redoc_url="/api/redoc" if settings.DEBUG else None
+    redoc_url="/api/redoc" if settings.DEBUG else None,
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Security middleware
@@ -58,6 +139,10 @@ app.add_middleware(
     expose_headers=["X-Total-Count", "X-Page", "X-Per-Page"]
 )
 
+# Compress larger responses (project lists with clips); a modest level
+# keeps CPU cost low and small bodies are sent as-is
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
 # Include authentication routes
 app.include_router(auth_routes.router)
 
@@ -68,127 +153,416 @@ api_manager = APIManager()
 security_manager = SecurityManager()
 file_manager = FileManager()
 
-# Audit logging middleware
-@app.middleware("http")
-async def audit_log_middleware(request: Request, call_next):
-    """Log all API requests for security auditing"""
-    start_time = datetime.utcnow()
-    
-    # Get user from JWT if present
-    user_id = None
+# Audit entries are queued by the middleware and written in batches by
+# audit_flush_job, so requests never wait on an INSERT. The queue is
+# bounded; when it is full the oldest entry is dropped.
+_AUDIT_QUEUE_SIZE = 10_000
+_AUDIT_BATCH_SIZE = 500
+_AUDIT_FLUSH_INTERVAL = 0.25
+_audit_queue: asyncio.Queue = asyncio.Queue(maxsize=_AUDIT_QUEUE_SIZE)
+_audit_dropped = 0
+
+def _queue_audit_log(entry: Dict[str, Any]) -> None:
+    global _audit_dropped
     try:
-        if "Authorization" in request.headers:
-            token = request.headers["Authorization"].replace("Bearer ", "")
-            payload = auth_handler.decode_token(token)
-            user_id = payload.get("user_id")
-    except:
-        pass
-    
-    # Process request
-    response = await call_next(request)
-    
-    # Log request (skip health checks and docs)
-    if not request.url.path.startswith(("/health", "/api/docs", "/api/redoc")):
-        process_time = (datetime.utcnow() - start_time).total_seconds()
+        _audit_queue.put_nowait(entry)
+    except asyncio.QueueFull:
+        _audit_queue.get_nowait()
+        _audit_queue.put_nowait(entry)
+        _audit_dropped += 1
+
+def _write_audit_logs(entries: List[Dict[str, Any]]) -> None:
+    """Store a batch of audit log entries in one transaction (blocking; run in a worker thread)"""
+    for entry in entries:
+        entry["created_at"] = datetime.utcfromtimestamp(entry["created_at"])
+    with get_db_session() as db:
+        db.execute(insert(AuditLog), entries)
+
+def _drain_audit_queue() -> List[Dict[str, Any]]:
+    entries = []
+    while not _audit_queue.empty():
+        entries.append(_audit_queue.get_nowait())
+    return entries
+
+async def audit_flush_job():
+    """Write queued audit entries, up to _AUDIT_BATCH_SIZE per transaction"""
+    global _audit_dropped
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await _audit_queue.get()]
+        deadline = loop.time() + _AUDIT_FLUSH_INTERVAL
+        while len(batch) < _AUDIT_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(_audit_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
         
-        # Create audit log asynchronously
+        if _audit_dropped:
+            logger.warning(f"Audit log queue full, dropped {_audit_dropped} entries")
+            _audit_dropped = 0
         try:
-            db = next(get_db())
-            AuditLogRepository.create_log(db, {
-                "user_id": user_id,
-                "action": f"{request.method} {request.url.path}",
-                "ip_address": request.client.host if request.client else None,
-                "user_agent": request.headers.get("User-Agent"),
-                "request_method": request.method,
-                "request_path": request.url.path,
-                "details": {
-                    "status_code": response.status_code,
-                    "process_time": process_time
-                }
-            })
-        except:
-            pass
+            await asyncio.to_thread(_write_audit_logs, batch)
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} audit log entries: {e}")
+
+# Requests not audited: health probes, docs and browser noise
+_AUDIT_SKIP_PREFIXES = ("/health", "/api/docs", "/api/redoc", "/openapi.json", "/favicon.ico")
+
+class AuditLogMiddleware:
+    """
+    Log all API requests for security auditing.
+    Plain ASGI rather than @app.middleware("http"): no extra task or
+    stream per request. Entries are only queued here; audit_flush_job
+    writes them.
+    """
+    
+    def __init__(self, app):
+        self.app = app
     
-    return response
+    async def __call__(self, scope, receive, send):
+        # Skipped requests pass straight through, before any per-request work
+        if scope["type"] != "http" or scope["path"].startswith(_AUDIT_SKIP_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        
+        start_time = time.perf_counter()
+        headers = Headers(scope=scope)
+        
+        # Get user from JWT if present
+        user_id = None
+        # Only bearer tokens are looked at; other schemes can't carry our JWT
+        authorization = headers.get("Authorization")
+        if authorization and authorization.startswith("Bearer "):
+            user_id = auth_handler.token_user_id(authorization[7:])
+        # Exposed to handlers as request.state.user_id
+        scope.setdefault("state", {})["user_id"] = user_id
+        
+        status_code = None
+        
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        # Process request
+        await self.app(scope, receive, send_wrapper)
+        
+        # Log request
+        path = scope["path"]
+        method = scope["method"]
+        client = scope.get("client")
+        _queue_audit_log({
+            "id": str(uuid7()),
+            "user_id": user_id,
+            "action": f"{method} {path}",
+            "ip_address": client[0] if client else None,
+            "user_agent": headers.get("User-Agent"),
+            "request_method": method,
+            "request_path": path,
+            "details": {
+                "status_code": status_code,
+                "process_time": time.perf_counter() - start_time
+            },
+            # Stamped now rather than by the database at flush time; kept
+            # as a float until the flusher's worker thread converts it
+            "created_at": time.time()
+        })
 
-# Initialize database
-@app.on_event("startup")
-async def startup_db_client():
+app.add_middleware(AuditLogMiddleware)
+
+def configure_thread_pools():
+    """
+    Size the pools blocking work is offloaded to: asyncio.to_thread (sync
+    repositories, upload copies) and AnyIO's limiter (sync dependencies,
+    run_in_threadpool). The defaults are small enough that a few slow
+    uploads or exports can starve database work on the same worker.
+    """
+    size = settings.THREADPOOL_SIZE
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=size, thread_name_prefix="blocking-io")
+    )
+    anyio.to_thread.current_default_thread_limiter().total_tokens = size
+
+def _default_admin_exists() -> bool:
+    with get_db_session() as db:
+        return UserRepository.get_user_by_email(db, "admin@openclippro.com") is not None
+
+def _create_default_admin(hashed_password: str) -> None:
+    with get_db_session() as db:
+        UserRepository.create_user(db, {
+            "email": "admin@openclippro.com",
+            "full_name": "Admin User",
+            "hashed_password": hashed_password,
+            "is_active": True,
+            "is_verified": True,
+            "roles": ["user", "admin"]
+        })
+
+async def _init_database():
+    """Create tables and, in development, the default admin user"""
     try:
-        init_db()
+        await asyncio.to_thread(init_db)
         logger.info("Database initialized successfully")
         
         # Create default admin user if none exists
-        db = next(get_db())
-        admin = UserRepository.get_user_by_email(db, "admin@openclippro.com")
-        if not admin and settings.ENVIRONMENT == "development":
-            admin = UserRepository.create_user(db, {
-                "email": "admin@openclippro.com",
-                "full_name": "Admin User",
-                "hashed_password": auth_handler.get_password_hash("admin123!"),
-                "is_active": True,
-                "is_verified": True,
-                "roles": ["user", "admin"]
-            })
+        if settings.ENVIRONMENT == "development" and not await asyncio.to_thread(_default_admin_exists):
+            hashed_password = await auth_handler.get_password_hash("admin123!")
+            await asyncio.to_thread(_create_default_admin, hashed_password)
             logger.info("Created default admin user")
             
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}")
 
+def _check_storage_dirs():
+    """Warn at startup if an upload/output directory isn't writable"""
+    for path in (settings.UPLOAD_DIR, settings.TEMP_DIR, settings.OUTPUTS_DIR):
+        if not os.access(path, os.W_OK):
+            logger.warning(f"Storage directory is not writable: {path}")
+
+# Daily maintenance jobs start in every worker; a claim in Redis lets only
+# the first worker to wake run each one. Slightly under a day, so the
+# next day's run isn't skipped when workers drift apart.
+_DAILY_JOB_CLAIM_SECONDS = 23 * 60 * 60
+
+async def _claim_daily_job(name: str) -> bool:
+    """True if this worker should run the named daily job now"""
+    return bool(await redis_client.set(
+        f"daily_job:{name}", os.getpid(), nx=True, ex=_DAILY_JOB_CLAIM_SECONDS
+    ))
+
+async def audit_partition_job():
+    """Create upcoming audit_logs partitions once a day (one worker per deployment)"""
+    while True:
+        try:
+            if await _claim_daily_job("audit_partitions"):
+                await asyncio.to_thread(ensure_audit_log_partitions)
+        except Exception as e:
+            logger.error(f"Failed to create audit log partitions: {e}")
+        await asyncio.sleep(24 * 60 * 60)
+
+async def revoked_filter_job():
+    """Rebuild the revoked refresh token Bloom filter once a day (one worker per deployment)"""
+    while True:
+        try:
+            if await _claim_daily_job("revoked_filter"):
+                await auth_handler.rebuild_revoked_filter()
+        except Exception as e:
+            logger.error(f"Failed to rebuild revoked token filter: {e}")
+        await asyncio.sleep(24 * 60 * 60)
+
 # Request/Response Models
+# Schemas are built at class creation (not on first request) and bodies are
+# read-only once parsed. Unknown fields are still ignored: the frontend
+# sends whole project objects to some of these endpoints.
+_REQUEST_MODEL_CONFIG = ConfigDict(
+    defer_build=False,
+    validate_assignment=False,
+    frozen=True
+)
+
 class ProjectCreateRequest(BaseModel):
+    model_config = _REQUEST_MODEL_CONFIG
+    
     name: str
     description: Optional[str] = None
-    type: str  # 'upload' or 'youtube'
+    type: Literal['upload', 'youtube']
     youtube_url: Optional[str] = None
 
 class AnalysisPromptRequest(BaseModel):
+    model_config = _REQUEST_MODEL_CONFIG
+    
     project_id: str
     prompt: str
     provider: Optional[str] = None
     model: Optional[str] = None
 
 class SettingsUpdateRequest(BaseModel):
-    category: str  # 'api_keys', 'model_settings', 'app_settings'
+    model_config = _REQUEST_MODEL_CONFIG
+    
+    category: Literal['api_keys', 'model_settings', 'app_settings']
     key: str
     value: Any
 
 class APITestRequest(BaseModel):
+    model_config = _REQUEST_MODEL_CONFIG
+    
     provider: str
     api_key: str
 
 class YouTubeURLRequest(BaseModel):
+    model_config = _REQUEST_MODEL_CONFIG
+    
     youtube_url: str
 
+# Statements for the hot project paths, built once. Values go in as bound
+# parameters, so every call hits SQLAlchemy's compiled statement cache.
+_USER_PROJECT_QUERY = select(Project).where(
+    Project.id == bindparam("project_id"),
+    Project.user_id == bindparam("user_id")
+)
+# Quota check: count at most max_projects rows, so users over the limit
+# (e.g. after a downgrade from pro) don't pay for scanning all of theirs
+_USER_PROJECT_QUOTA_QUERY = select(func.count()).select_from(
+    select(Project.id)
+    .where(Project.user_id == bindparam("user_id"))
+    .limit(bindparam("max_projects"))
+    .subquery()
+)
+_USER_PROJECTS_WITH_CLIPS_QUERY = (
+    select(Project)
+    .options(selectinload(Project.clips))
+    .where(Project.user_id == bindparam("user_id"))
+    .order_by(Project.created_at.desc())
+)
+_USER_PROJECT_WITH_CLIPS_QUERY = _USER_PROJECT_QUERY.options(selectinload(Project.clips))
+
+# Quota counters, read fresh: the user from get_current_user may come from
+# its short-lived cache, which doesn't see uploads or analyses since
+_USER_USAGE_QUERY = (
+    select(User.storage_used, User.api_calls_count)
+    .where(User.id == bindparam("user_id"))
+)
+
+# Blocking database work for endpoints that still go through the sync
+# Session and repositories. Each helper runs whole in a worker thread
+# (asyncio.to_thread), so the event loop never waits on a query.
+def _get_user_usage(db: Session, user_id: str) -> Tuple[int, int]:
+    """(storage_used, api_calls_count) for a user"""
+    row = db.execute(_USER_USAGE_QUERY, {"user_id": user_id}).one()
+    return row.storage_used or 0, row.api_calls_count or 0
+
+def _get_user_project(db: Session, project_id: str, user_id: str) -> Optional[Project]:
+    return db.scalar(_USER_PROJECT_QUERY, {"project_id": project_id, "user_id": user_id})
+
+def _create_user_project(db: Session, project_data: Dict[str, Any], max_projects: Optional[int]) -> Optional[Dict[str, Any]]:
+    """Create a project unless the user is at max_projects; returns its dict or None"""
+    if max_projects is not None:
+        project_count = db.scalar(
+            _USER_PROJECT_QUOTA_QUERY,
+            {"user_id": project_data["user_id"], "max_projects": max_projects}
+        )
+        if project_count >= max_projects:
+            return None
+    return ProjectRepository.create_project(db, project_data).to_dict()
+
+def _delete_user_project(db: Session, project: Project, user_id: str) -> bool:
+    if project.file_size:
+        UserRepository.update_storage_used(db, user_id, -project.file_size)
+    return ProjectRepository.delete_project(db, project.id)
+
+def _record_upload(db: Session, project_id: str, user_id: str, updates: Dict[str, Any], size: int) -> Dict[str, Any]:
+    updated_project = ProjectRepository.update_project(db, project_id, updates)
+    UserRepository.update_storage_used(db, user_id, size)
+    return updated_project.to_dict()
+
+# Decrypted provider API keys by (user_id, provider), so model listing and
+# analysis skip the settings SELECT and the decrypt. set_api_key evicts the
+# entry on this worker; other workers pick up a new key within the TTL.
+# Sized for ~1000 active users with keys for every provider.
+_api_key_cache = TTLCache(maxsize=4096, ttl=300)
+
+def _load_user_api_key(db: Session, user_id: str, provider: str) -> Optional[str]:
+    """Read and decrypt a stored provider key (blocking; run in a thread)"""
+    api_key_setting = SettingsRepository.get_setting(db, "api_keys", f"{provider}_key_{user_id}")
+    if not api_key_setting:
+        return None
+    return security_manager.decrypt_value(api_key_setting.value)
+
+async def _get_user_api_key(db: Session, user_id: str, provider: str) -> Optional[str]:
+    cache_key = (user_id, provider)
+    api_key = _api_key_cache.get(cache_key)
+    if api_key is None:
+        api_key = await asyncio.to_thread(_load_user_api_key, db, user_id, provider)
+        if api_key is not None:
+            _api_key_cache[cache_key] = api_key
+    return api_key
+
+# Mark the project completed and count the API call in one statement
+_COMPLETE_ANALYSIS_SQL = text("""
+    WITH upd AS (
+        UPDATE users SET api_calls_count = api_calls_count + 1 WHERE id = :user_id
+    )
+    UPDATE projects SET status = 'completed' WHERE id = :project_id
+""")
+
+def _complete_analysis(project_id: str, user_id: str, clip_rows: List[Dict[str, Any]]) -> None:
+    """Insert clips, mark the project completed and count the API call in one transaction"""
+    with get_db_session() as db:
+        if clip_rows:
+            db.execute(insert(Clip), clip_rows)
+        if db.bind.dialect.name == "postgresql":
+            db.execute(_COMPLETE_ANALYSIS_SQL, {"project_id": project_id, "user_id": user_id})
+            return
+        db.execute(
+            update(Project)
+            .where(Project.id == project_id)
+            .values(status="completed")
+            .execution_options(synchronize_session=False)
+        )
+        db.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(api_calls_count=User.api_calls_count + 1)
+            .execution_options(synchronize_session=False)
+        )
+
+def _fail_analysis(project_id: str, error_message: str) -> None:
+    with get_db_session() as db:
+        ProjectRepository.update_project(db, project_id, {"status": "error", "error_message": error_message})
+
+# Version, interpreter and platform don't change while the process runs
+_HEALTH_STATIC = {
+    "version": "1.0.0",
+    "environment": {
+        "python": sys.version,
+        "platform": platform.platform()
+    }
+}
+
+async def _probe(check, timeout: float = 2.0) -> Dict[str, Any]:
+    """Run one dependency check with a time limit"""
+    try:
+        await asyncio.wait_for(check, timeout)
+        return {"status": "connected", "error": None}
+    except asyncio.TimeoutError:
+        return {"status": "error", "error": "timed out"}
+    except Exception as e:
+        return {"status": "error", "error": str(e)}
+
+# Last health result, so frequent liveness/readiness probes reuse it
+# instead of each taking a pooled connection and a Redis round-trip
+_health_cache = TTLCache(maxsize=1, ttl=1)
+
 # Health check (public endpoint)
 @app.get("/health")
-async def health_check(db: Session = Depends(get_db)):
+async def health_check(db: AsyncSession = Depends(get_async_db)):
     """
     Check the health status of the backend service and its dependencies
     """
+    cached = _health_cache.get("health")
+    if cached is not None:
+        return cached
+    
     try:
-        # Test database connection
-        db_status = "connected"
-        db_error = None
-        try:
-            setting = db.query(Setting).first()
-        except Exception as e:
-            db_status = "error"
-            db_error = str(e)
+        # Probe dependencies concurrently: latency is the slowest probe, not the sum
+        database, redis_status = await asyncio.gather(
+            _probe(db.execute(text("SELECT 1"))),
+            _probe(redis_client.ping())
+        )
         
-        return {
+        health = {
             "status": "healthy",
             "timestamp": datetime.now().isoformat(),
-            "version": "1.0.0",
-            "environment": {
-                "python": sys.version,
-                "platform": platform.platform()
-            },
-            "database": {
-                "status": db_status,
-                "error": db_error
-            }
+            **_HEALTH_STATIC,
+            "database": database,
+            "redis": redis_status
         }
+        _health_cache["health"] = health
+        return health
     except Exception as e:
         logger.error(f"Health check failed: {e}")
         return {
@@ -197,13 +571,17 @@ async def health_check(db: Session = Depends(get_db)):
             "error": str(e)
         }
 
+@functools.lru_cache(maxsize=1)
+def _providers_payload() -> bytes:
+    """Provider metadata is static config, so it is serialized once"""
+    return orjson.dumps({"providers": api_manager.get_providers()})
+
 # Protected endpoints - require authentication
 @app.get("/api/providers")
-async def get_providers(current_user: User = Depends(auth_handler.get_current_user)):
+async def get_providers(current_user: ClaimsUser = Depends(auth_handler.get_claims_user)):
     """Get all available AI providers"""
     try:
-        providers = api_manager.get_providers()
-        return {"providers": providers}
+        return Response(_providers_payload(), media_type="application/json")
     except Exception as e:
         logger.error(f"Error getting providers: {e}")
         raise HTTPException(status_code=500, detail="Failed to get providers")
@@ -211,23 +589,20 @@ async def get_providers(current_user: User = Depends(auth_handler.get_current_us
 @app.get("/api/models/{provider}")
 async def get_available_models(
     provider: str, 
-    current_user: User = Depends(auth_handler.get_current_user),
+    current_user: ClaimsUser = Depends(auth_handler.get_claims_user),
     db: Session = Depends(get_db)
 ):
     """Get available models for a provider"""
     try:
         # Get user's API key for the provider
-        api_key_setting = SettingsRepository.get_setting(
-            db, "api_keys", f"{provider}_key_{current_user.id}"
-        )
+        api_key = await _get_user_api_key(db, current_user.id, provider)
         
-        if not api_key_setting:
+        if not api_key:
             raise HTTPException(
                 status_code=400, 
                 detail=f"No API key configured for {provider}"
             )
         
-        api_key = security_manager.decrypt_value(api_key_setting.value)
         models = await api_manager.get_available_models(provider, api_key, db, security_manager, SettingsRepository)
         
         return {"models": models}
@@ -240,16 +615,19 @@ async def get_available_models(
 # Projects endpoints with user ownership
 @app.get("/api/projects")
 async def get_projects(
-    current_user: User = Depends(auth_handler.get_current_user),
-    db: Session = Depends(get_db)
+    current_user: ClaimsUser = Depends(auth_handler.get_claims_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all projects for current user"""
     try:
-        projects = db.query(Project).filter(
-            Project.user_id == current_user.id
-        ).order_by(Project.created_at.desc()).all()
+        # Clips for every project come back in one IN query, not one per to_dict()
+        projects = (await db.scalars(
+            _USER_PROJECTS_WITH_CLIPS_QUERY, {"user_id": current_user.id}
+        )).all()
         
-        return {"projects": [project.to_dict() for project in projects]}
+        # Returned as a response directly so FastAPI's jsonable_encoder pass
+        # is skipped; orjson encodes the dicts (datetimes included) natively
+        return ORJSONResponse({"projects": [project.to_dict() for project in projects]})
     except Exception as e:
         logger.error(f"Error getting projects: {e}")
         raise HTTPException(status_code=500, detail="Failed to get projects")
@@ -257,41 +635,30 @@ async def get_projects(
 @app.get("/api/projects/{project_id}")
 async def get_project(
     project_id: str,
-    current_user: User = Depends(auth_handler.get_current_user),
-    db: Session = Depends(get_db)
+    current_user: ClaimsUser = Depends(auth_handler.get_claims_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get a specific project"""
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.user_id == current_user.id
-    ).first()
+    project = await db.scalar(
+        _USER_PROJECT_WITH_CLIPS_QUERY,
+        {"project_id": project_id, "user_id": current_user.id}
+    )
     
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    return {"project": project.to_dict()}
+    return ORJSONResponse({"project": project.to_dict()})
 
 @app.post("/api/projects")
 async def create_project(
     request: ProjectCreateRequest,
-    current_user: User = Depends(auth_handler.get_current_user),
+    current_user: CurrentUser = Depends(auth_handler.get_current_user),
     db: Session = Depends(get_db)
 ):
     """Create a new project"""
     try:
-        # Check user limits
-        project_count = db.query(Project).filter(
-            Project.user_id == current_user.id
-        ).count()
-        
-        if project_count >= settings.FREE_TIER_PROJECTS and "pro" not in current_user.roles:
-            raise HTTPException(
-                status_code=403,
-                detail=f"Free tier limited to {settings.FREE_TIER_PROJECTS} projects. Please upgrade."
-            )
-        
         project_data = {
-            "id": str(uuid.uuid4()),
+            "id": str(uuid7()),
             "name": request.name,
             "description": request.description,
             "type": request.type,
@@ -301,10 +668,17 @@ async def create_project(
             "analysis_prompt": ""
         }
         
-        project = ProjectRepository.create_project(db, project_data)
-        logger.info(f"Created project: {project.id} for user: {current_user.email}")
+        # Check user limits and create in one trip to the worker thread
+        max_projects = None if "pro" in current_user.roles else settings.FREE_TIER_PROJECTS
+        project = await asyncio.to_thread(_create_user_project, db, project_data, max_projects)
+        if project is None:
+            raise HTTPException(
+                status_code=403,
+                detail=f"Free tier limited to {settings.FREE_TIER_PROJECTS} projects. Please upgrade."
+            )
+        logger.info(f"Created project: {project_data['id']} for user: {current_user.email}")
         
-        return {"project": project.to_dict()}
+        return {"project": project}
     except HTTPException:
         raise
     except Exception as e:
@@ -314,25 +688,18 @@ async def create_project(
 @app.delete("/api/projects/{project_id}")
 async def delete_project(
     project_id: str,
-    current_user: User = Depends(auth_handler.get_current_user),
+    current_user: CurrentUser = Depends(auth_handler.get_current_user),
     db: Session = Depends(get_db)
 ):
     """Delete a project"""
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.user_id == current_user.id
-    ).first()
+    project = await asyncio.to_thread(_get_user_project, db, project_id, current_user.id)
     
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
     try:
-        # Update user storage
-        if project.file_size:
-            UserRepository.update_storage_used(db, current_user.id, -project.file_size)
-        
-        # Delete project
-        success = ProjectRepository.delete_project(db, project_id)
+        # Update user storage and delete project
+        success = await asyncio.to_thread(_delete_user_project, db, project, current_user.id)
         if not success:
             raise HTTPException(status_code=500, detail="Failed to delete project")
         
@@ -353,14 +720,11 @@ async def delete_project(
 async def upload_video(
     project_id: str,
     file: UploadFile = File(...),
-    current_user: User = Depends(auth_handler.get_current_user),
+    current_user: CurrentUser = Depends(auth_handler.get_current_user),
     db: Session = Depends(get_db)
 ):
     """Upload video file for a project"""
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.user_id == current_user.id
-    ).first()
+    project = await asyncio.to_thread(_get_user_project, db, project_id, current_user.id)
     
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
@@ -370,27 +734,34 @@ async def upload_video(
         if not file.content_type.startswith('video/'):
             raise HTTPException(status_code=400, detail="File must be a video")
         
-        # Check file size
-        if file.size > settings.MAX_UPLOAD_SIZE:
-            raise HTTPException(
-                status_code=413,
-                detail=f"File too large. Maximum size is {settings.MAX_UPLOAD_SIZE // (1024**3)}GB"
-            )
-        
         # Check user storage limits
         storage_limit = settings.FREE_TIER_STORAGE_GB * 1024 * 1024 * 1024
         if "pro" in current_user.roles:
             storage_limit *= 10  # Pro users get 10x storage
-            
-        if current_user.storage_used + file.size > storage_limit:
+        storage_used, _ = await asyncio.to_thread(_get_user_usage, db, current_user.id)
+        storage_left = storage_limit - storage_used
+        storage_exceeded = HTTPException(
+            status_code=413,
+            detail="Storage limit exceeded. Please upgrade or delete old projects."
+        )
+        if storage_left <= 0:
+            raise storage_exceeded
+        
+        # Save file. file.size comes from the client (and may be missing),
+        # so the limits are enforced on the bytes actually written
+        max_bytes = min(settings.MAX_UPLOAD_SIZE, storage_left)
+        try:
+            file_path, file_size = await file_manager.save_upload(file, project_id, max_bytes)
+        except HTTPException as e:
+            if e.status_code != 413:
+                raise
+            if max_bytes < settings.MAX_UPLOAD_SIZE:
+                raise storage_exceeded
             raise HTTPException(
                 status_code=413,
-                detail="Storage limit exceeded. Please upgrade or delete old projects."
+                detail=f"File too large. Maximum size is {settings.MAX_UPLOAD_SIZE // (1024**3)}GB"
             )
         
-        # Save file
-        file_path = await file_manager.save_upload(file, project_id)
-        
         # Process video metadata
         video_data = await video_processor.extract_metadata(file_path)
         
@@ -399,47 +770,111 @@ async def upload_video(
             "video_data": {
                 "file_path": file_path,
                 "filename": file.filename,
-                "size": file.size,
+                "size": file_size,
                 "duration": video_data.get('duration'),
                 "resolution": video_data.get('resolution'),
                 "fps": video_data.get('fps')
             },
-            "file_size": file.size,
+            "file_size": file_size,
             "status": "uploaded"
         }
         
-        updated_project = ProjectRepository.update_project(db, project_id, updates)
-        UserRepository.update_storage_used(db, current_user.id, file.size)
+        updated_project = await asyncio.to_thread(
+            _record_upload, db, project_id, current_user.id, updates, file_size
+        )
         
         logger.info(f"Video uploaded for project: {project_id}")
         
-        return {"project": updated_project.to_dict()}
+        return {"project": updated_project}
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error uploading video: {e}")
         raise HTTPException(status_code=500, detail="Failed to upload video")
 
+async def _run_analysis(
+    project_id: str,
+    user_id: str,
+    video_path: str,
+    prompt: str,
+    provider: str,
+    api_key: str
+):
+    """
+    Analyze a video after analyze_video has responded (run by
+    analysis_worker). Results and the final status are written through a
+    session of the task's own, since the request-scoped one is closed by then.
+    """
+    try:
+        clips_data = await ai_analyzer.analyze_video(video_path, prompt, provider, api_key)
+        
+        # Create clips in database with a single batched INSERT
+        clip_rows = [
+            {
+                "id": str(uuid7()),
+                "project_id": project_id,
+                "title": clip_data.get("title"),
+                "description": clip_data.get("explanation"),
+                "start_time": clip_data.get("start_time"),
+                "end_time": clip_data.get("end_time"),
+                "duration": clip_data.get("end_time") - clip_data.get("start_time"),
+                "score": clip_data.get("score"),
+                "analysis_reason": clip_data.get("explanation"),
+                "tags": []
+            }
+            for clip_data in clips_data
+        ]
+        await asyncio.to_thread(_complete_analysis, project_id, user_id, clip_rows)
+        logger.info(f"Analysis completed for project: {project_id}")
+    except Exception as e:
+        logger.error(f"Error analyzing video: {e}")
+        await asyncio.to_thread(_fail_analysis, project_id, str(e))
+
+# Accepted analyses wait here for one of ANALYSIS_WORKERS analysis_worker
+# tasks, so a burst of requests can't run an unbounded number of AI calls
+# (and their memory and connections) at once
+_analysis_queue: asyncio.Queue = asyncio.Queue(maxsize=settings.ANALYSIS_QUEUE_SIZE)
+_ANALYSIS_INTERRUPTED = "Analysis was interrupted by a server restart"
+
+async def analysis_worker():
+    """Run queued analyses one at a time"""
+    while True:
+        job = await _analysis_queue.get()
+        try:
+            await _run_analysis(*job)
+        except asyncio.CancelledError:
+            await asyncio.to_thread(_fail_analysis, job[0], _ANALYSIS_INTERRUPTED)
+            raise
+        finally:
+            _analysis_queue.task_done()
+
+def _fail_queued_analyses() -> None:
+    """Mark analyses that never started as failed (on shutdown)"""
+    while not _analysis_queue.empty():
+        _fail_analysis(_analysis_queue.get_nowait()[0], _ANALYSIS_INTERRUPTED)
+
 # Analysis with rate limiting
-@app.post("/api/projects/{project_id}/analyze")
+@app.post("/api/projects/{project_id}/analyze", status_code=202)
 async def analyze_video(
     project_id: str,
     request: AnalysisPromptRequest,
-    current_user: User = Depends(auth_handler.get_current_user),
+    current_user: CurrentUser = Depends(auth_handler.get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Start AI analysis of the video"""
+    """
+    Start AI analysis of the video. Returns 202 once the analysis is
+    queued; poll the project for status 'completed' or 'error'.
+    Returns 503 when the analysis queue is full.
+    """
     # Check API call limits
-    if current_user.api_calls_count >= settings.FREE_TIER_API_CALLS and "pro" not in current_user.roles:
+    _, api_calls_count = await asyncio.to_thread(_get_user_usage, db, current_user.id)
+    if api_calls_count >= settings.FREE_TIER_API_CALLS and "pro" not in current_user.roles:
         raise HTTPException(
             status_code=429,
             detail=f"API call limit reached ({settings.FREE_TIER_API_CALLS} calls). Please upgrade."
         )
     
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.user_id == current_user.id
-    ).first()
+    project = await asyncio.to_thread(_get_user_project, db, project_id, current_user.id)
     
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
@@ -447,99 +882,91 @@ async def analyze_video(
     if not project.video_data:
         raise HTTPException(status_code=400, detail="No video data available")
     
+    # Read before the status update below commits and expires the instance
+    video_path = project.video_data.get("file_path")
+    
     try:
-        # Update project with analysis prompt
-        updates = {
-            "analysis_prompt": request.prompt,
-            "status": "analyzing",
-            "analysis_provider": request.provider,
-            "analysis_model": request.model
-        }
-        updated_project = ProjectRepository.update_project(db, project_id, updates)
-        
         # Get API key for provider
         provider = request.provider or "openai"
-        api_key_setting = SettingsRepository.get_setting(
-            db, "api_keys", f"{provider}_key_{current_user.id}"
-        )
+        api_key = await _get_user_api_key(db, current_user.id, provider)
         
-        if not api_key_setting:
+        if not api_key:
             raise HTTPException(
                 status_code=400,
                 detail=f"No API key configured for {provider}"
             )
         
-        api_key = security_manager.decrypt_value(api_key_setting.value)
-        
-        # Start analysis (this would be async in production)
-        video_path = updated_project.video_data.get("file_path")
-        clips_data = await ai_analyzer.analyze_video(
-            video_path,
-            request.prompt,
-            provider,
-            api_key
-        )
-        
-        # Create clips in database
-        for clip_data in clips_data:
-            clip_dict = {
-                "project_id": project_id,
-                "title": clip_data.get("title"),
-                "description": clip_data.get("explanation"),
-                "start_time": clip_data.get("start_time"),
-                "end_time": clip_data.get("end_time"),
-                "duration": clip_data.get("end_time") - clip_data.get("start_time"),
-                "score": clip_data.get("score"),
-                "analysis_reason": clip_data.get("explanation"),
-                "tags": []
-            }
-            ClipRepository.create_clip(db, clip_dict)
+        if _analysis_queue.full():
+            raise HTTPException(
+                status_code=503,
+                detail="Too many analyses in progress. Please try again shortly."
+            )
         
-        # Update project status and user API calls
-        ProjectRepository.update_project(db, project_id, {"status": "completed"})
-        UserRepository.increment_api_calls(db, current_user.id)
+        # Update project with analysis prompt
+        updates = {
+            "analysis_prompt": request.prompt,
+            "status": "analyzing",
+            "analysis_provider": request.provider,
+            "analysis_model": request.model
+        }
+        await asyncio.to_thread(ProjectRepository.update_project, db, project_id, updates)
         
-        # Get updated project with clips
-        final_project = ProjectRepository.get_project_by_id(db, project_id)
-        logger.info(f"Analysis completed for project: {project_id}")
+        # Queued only after the status update, so a fast worker can't
+        # finish first and have 'completed' overwritten with 'analyzing'
+        try:
+            _analysis_queue.put_nowait(
+                (project_id, current_user.id, video_path, request.prompt, provider, api_key)
+            )
+        except asyncio.QueueFull:
+            await asyncio.to_thread(_fail_analysis, project_id, "Analysis queue is full")
+            raise HTTPException(
+                status_code=503,
+                detail="Too many analyses in progress. Please try again shortly."
+            )
         
-        return {"project": final_project.to_dict()}
+        return {"status": "queued", "project_id": project_id}
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error analyzing video: {e}")
-        ProjectRepository.update_project(db, project_id, {"status": "error", "error_message": str(e)})
+        logger.error(f"Error starting analysis: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to analyze video: {str(e)}")
 
 # Settings endpoints with user context
 @app.get("/api/settings")
 async def get_settings(
-    current_user: User = Depends(auth_handler.get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(auth_handler.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get user settings"""
     try:
+        projects_count = await db.scalar(
+            select(func.count()).select_from(Project).where(Project.user_id == current_user.id)
+        )
+        usage = (await db.execute(_USER_USAGE_QUERY, {"user_id": current_user.id})).one()
         settings_dict = {
             "model_settings": {},
             "app_settings": {},
             "usage": {
-                "storage_used": current_user.storage_used,
+                "storage_used": usage.storage_used,
                 "storage_limit": settings.FREE_TIER_STORAGE_GB * 1024 * 1024 * 1024,
-                "api_calls": current_user.api_calls_count,
+                "api_calls": usage.api_calls_count,
                 "api_limit": settings.FREE_TIER_API_CALLS,
-                "projects_count": db.query(Project).filter(Project.user_id == current_user.id).count(),
+                "projects_count": projects_count,
                 "projects_limit": settings.FREE_TIER_PROJECTS
             }
         }
         
-        # Get user-specific settings
-        user_settings = db.query(Setting).filter(Setting.user_id == current_user.id).all()
+        # Get user-specific settings for both categories in one query; only
+        # the columns used, and never the api_keys rows
+        user_settings = await db.execute(
+            select(Setting.category, Setting.key, Setting.value).where(
+                Setting.user_id == current_user.id,
+                Setting.category.in_(("model_settings", "app_settings"))
+            )
+        )
         
-        for setting in user_settings:
-            if setting.category == "model_settings":
-                settings_dict["model_settings"][setting.key] = setting.value
-            elif setting.category == "app_settings":
-                settings_dict["app_settings"][setting.key] = setting.value
+        for category, key, value in user_settings:
+            settings_dict[category][key] = value
         
         return settings_dict
     except Exception as e:
@@ -549,7 +976,7 @@ async def get_settings(
 @app.post("/api/settings/api-key")
 async def set_api_key(
     request: APITestRequest,
-    current_user: User = Depends(auth_handler.get_current_user),
+    current_user: CurrentUser = Depends(auth_handler.get_current_user),
     db: Session = Depends(get_db)
 ):
     """Securely store an API key for current user"""
@@ -566,12 +993,14 @@ async def set_api_key(
         # Encrypt and store the key
         encrypted_key = security_manager.encrypt_value(request.api_key)
         
-        SettingsRepository.create_or_update_setting(
+        await asyncio.to_thread(
+            SettingsRepository.create_or_update_setting,
             db,
             "api_keys",
             f"{request.provider}_key_{current_user.id}",
             encrypted_key
         )
+        _api_key_cache.pop((current_user.id, request.provider), None)
         
         logger.info(f"API key stored for {request.provider} by user {current_user.email}")
         
@@ -583,14 +1012,21 @@ async def set_api_key(
         raise HTTPException(status_code=500, detail="Failed to store API key")
 
 # Admin endpoints
+# All admin counters in one round-trip
+_ADMIN_STATS_QUERY = select(
+    func.count(),
+    func.count().filter(User.is_active == True),
+    select(func.count()).select_from(Project).scalar_subquery(),
+    select(func.count()).select_from(Clip).scalar_subquery()
+).select_from(User)
+
 @app.get("/api/admin/stats", dependencies=[Depends(auth_handler.require_roles(["admin"]))])
-async def get_admin_stats(db: Session = Depends(get_db)):
+async def get_admin_stats(db: AsyncSession = Depends(get_async_db)):
     """Get system statistics (admin only)"""
     try:
-        total_users = db.query(User).count()
-        active_users = db.query(User).filter(User.is_active == True).count()
-        total_projects = db.query(Project).count()
-        total_clips = db.query(Clip).count()
+        total_users, active_users, total_projects, total_clips = (
+            await db.execute(_ADMIN_STATS_QUERY)
+        ).one()
         
         return {
             "users": {
@@ -611,7 +1047,7 @@ async def get_admin_stats(db: Session = Depends(get_db)):
 # Error handlers
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail}
     )
@@ -619,16 +1055,25 @@ async def http_exception_handler(request: Request, exc: HTTPException):
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
     logger.error(f"Unhandled exception: {exc}")
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={"detail": "Internal server error"}
     )
 
 if __name__ == "__main__":
+    # libuv event loop where available (not on Windows)
+    try:
+        import uvloop  # noqa: F401
+        loop = "uvloop"
+    except ImportError:
+        loop = "asyncio"
+    
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
         reload=True,
-        log_level="info"
+        log_level="info",
+        loop=loop,
+        http="httptools"
     )
@@ -1,6 +1,8 @@
 import asyncio
 import logging
 import json
+import math
+import re
 import base64
 from typing import Dict, List, Optional, Any, Tuple
 from pathlib import Path
@@ -8,6 +10,11 @@ import tempfile
 import os
 import time
 import random
+import copy
+import hashlib
+import httpx
+import orjson
+from cachetools import LRUCache, TTLCache
 
 # AI provider imports
 try:
@@ -20,47 +27,156 @@ try:
 except ImportError:
     genai = None
 
-try:
-    import requests
-except ImportError:
-    requests = None
-
 from models.project import Clip
 from services.video_processor import VideoProcessor
 
 logger = logging.getLogger(__name__)
 
+# Mock data for demo analysis clips, by clip type
+MOCK_CLIP_TYPES = {
+    "funny": [
+        ("Hilarious reaction", "Subject displays an unexpected and humorous reaction", 85),
+        ("Comedy gold moment", "Classic comedic timing and delivery", 92),
+        ("Unexpected humor", "Surprising comedic twist that engages viewers", 78)
+    ],
+    "engaging": [
+        ("Hook moment", "Strong opening that captures attention immediately", 88),
+        ("Peak engagement", "Highest point of audience interest and engagement", 94),
+        ("Attention grabber", "Visually striking or surprising content", 82)
+    ],
+    "educational": [
+        ("Key insight", "Important information delivered clearly", 90),
+        ("Learning moment", "Clear explanation of a complex concept", 87),
+        ("Important concept", "Foundational idea explained well", 85)
+    ],
+    "emotional": [
+        ("Touching moment", "Genuine emotional connection established", 89),
+        ("Emotional peak", "Height of emotional impact in the content", 93),
+        ("Heartfelt scene", "Authentic emotional display that resonates", 86)
+    ]
+}
+MOCK_CLIP_KEYS = tuple(MOCK_CLIP_TYPES)
+
+# Prompt keywords per analysis type, checked in this order. Prompts are
+# matched word by word, so common inflections are listed explicitly.
+ANALYSIS_TYPE_KEYWORDS = {
+    'humor': frozenset({'funny', 'humor', 'humour', 'laugh', 'laughs', 'laughing', 'comedy', 'comedic', 'hilarious'}),
+    'viral': frozenset({'viral', 'share', 'shareable', 'trending', 'social'}),
+    'educational': frozenset({'teach', 'teaching', 'learn', 'learning', 'explain', 'explains', 'explanation', 'educational', 'tutorial', 'tutorials'}),
+    'emotional': frozenset({'emotional', 'touching', 'sad', 'inspiring', 'heartfelt'})
+}
+
+_WORD_RE = re.compile(r"[a-z]+")
+
+# Segments per LM Studio request, and how many of those requests run at once
+ANALYSIS_SHARD_SEGMENTS = 20  # about 8 minutes of video
+ANALYSIS_SHARD_CONCURRENCY = 4
+# Clips overlapping a higher-scored clip by more than this are dropped when
+# shard results are merged (neighbouring shards can suggest the same moment)
+CLIP_MERGE_MAX_OVERLAP = 0.5
+
+def _prompt_words(prompt: str) -> frozenset:
+    """Lowercased words of a prompt, for keyword set lookups"""
+    return frozenset(_WORD_RE.findall(prompt.lower()))
+
+# Provider results for identical requests (same video file, prompt, provider
+# and settings) are reused instead of paying for another LLM call
+ANALYSIS_CACHE_SIZE = 256
+ANALYSIS_CACHE_TTL = 3600  # seconds
+
+# Output instructions shared by every analysis. They go in the system
+# message with the template text; only the user message (request and
+# segments) varies between calls.
+ANALYSIS_RESPONSE_INSTRUCTIONS = """Analyze the video segments in the user's message and identify the best clips that match the user's request. For each recommended clip, provide:
+
+1. Segment number(s) it spans
+2. Exact start and end times (in seconds)
+3. A catchy title (max 50 characters)
+4. A score from 0-100 based on the criteria
+5. A brief explanation (1-2 sentences) of why this clip is valuable
+
+Format your response as JSON with this structure:
+{
+  "clips": [
+    {
+      "title": "Clip title",
+      "start_time": 0.0,
+      "end_time": 15.0,
+      "score": 85,
+      "explanation": "Brief explanation of why this clip is valuable."
+    }
+  ]
+}
+
+Provide 3-8 clips, focusing on the highest quality moments that best match the user's request."""
+
+# Analysis templates, by name
+ANALYSIS_TEMPLATES = {
+    'humor': {
+        'system_prompt': "You are an expert at identifying funny and humorous moments in videos. Analyze the content and identify clips that would make people laugh.",
+        'scoring_criteria': "Rate based on comedic timing, unexpected moments, reactions, and general humor appeal."
+    },
+    'engagement': {
+        'system_prompt': "You are an expert at identifying engaging and attention-grabbing moments in videos. Find clips that would hook viewers and keep them watching.",
+        'scoring_criteria': "Rate based on visual interest, emotional impact, information density, and viewer retention potential."
+    },
+    'educational': {
+        'system_prompt': "You are an expert at identifying educational and informative moments in videos. Find clips that teach or explain concepts clearly.",
+        'scoring_criteria': "Rate based on clarity of explanation, educational value, practical applicability, and learning potential."
+    },
+    'emotional': {
+        'system_prompt': "You are an expert at identifying emotionally impactful moments in videos. Find clips that evoke strong emotional responses.",
+        'scoring_criteria': "Rate based on emotional intensity, relatability, storytelling impact, and viewer connection."
+    },
+    'viral': {
+        'system_prompt': "You are an expert at identifying viral-worthy moments in videos. Find clips with high shareability and social media potential.",
+        'scoring_criteria': "Rate based on shareability, uniqueness, trending potential, and social media appeal."
+    }
+}
+
+# Full system prompt per template: built once, and byte-identical on every
+# call so providers' prefix caching can reuse it
+ANALYSIS_SYSTEM_PROMPTS = {
+    name: (
+        f"{template['system_prompt']}\n\n"
+        f"Scoring Criteria: {template['scoring_criteria']}\n\n"
+        f"{ANALYSIS_RESPONSE_INSTRUCTIONS}"
+    )
+    for name, template in ANALYSIS_TEMPLATES.items()
+}
+
+def _clip_overlap(a: Dict[str, Any], b: Dict[str, Any]) -> float:
+    """Intersection over union of two clips' time ranges"""
+    intersection = min(a["end_time"], b["end_time"]) - max(a["start_time"], b["start_time"])
+    if intersection <= 0:
+        return 0.0
+    union = max(a["end_time"], b["end_time"]) - min(a["start_time"], b["start_time"])
+    return intersection / union
+
+def _merge_overlapping_clips(clips: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Keep the best-scored of each group of overlapping clips, in time order"""
+    kept = []
+    for clip in sorted(clips, key=lambda c: c["score"], reverse=True):
+        if all(_clip_overlap(clip, other) <= CLIP_MERGE_MAX_OVERLAP for other in kept):
+            kept.append(clip)
+    kept.sort(key=lambda c: c["start_time"])
+    return kept
+
 class AIAnalyzer:
     """Service for analyzing videos using various AI providers"""
     
     def __init__(self):
         self.video_processor = VideoProcessor()
+        # Shared client for LM Studio calls, so requests don't block the
+        # event loop and connections to the local server are reused
+        self.http_client = httpx.AsyncClient(timeout=120.0)
+        self._analysis_cache = TTLCache(maxsize=ANALYSIS_CACHE_SIZE, ttl=ANALYSIS_CACHE_TTL)
+        # Segments by (path, mtime, segment_length), so each video version
+        # is probed once; the locks make concurrent callers share one probe
+        self._segment_cache = LRUCache(maxsize=256)
+        self._segment_locks: Dict[Tuple[str, int, int], asyncio.Lock] = {}
         self.supported_providers = ['openai', 'gemini', 'lmstudio']
         
-        # Analysis templates
-        self.analysis_templates = {
-            'humor': {
-                'system_prompt': "You are an expert at identifying funny and humorous moments in videos. Analyze the content and identify clips that would make people laugh.",
-                'scoring_criteria': "Rate based on comedic timing, unexpected moments, reactions, and general humor appeal."
-            },
-            'engagement': {
-                'system_prompt': "You are an expert at identifying engaging and attention-grabbing moments in videos. Find clips that would hook viewers and keep them watching.",
-                'scoring_criteria': "Rate based on visual interest, emotional impact, information density, and viewer retention potential."
-            },
-            'educational': {
-                'system_prompt': "You are an expert at identifying educational and informative moments in videos. Find clips that teach or explain concepts clearly.",
-                'scoring_criteria': "Rate based on clarity of explanation, educational value, practical applicability, and learning potential."
-            },
-            'emotional': {
-                'system_prompt': "You are an expert at identifying emotionally impactful moments in videos. Find clips that evoke strong emotional responses.",
-                'scoring_criteria': "Rate based on emotional intensity, relatability, storytelling impact, and viewer connection."
-            },
-            'viral': {
-                'system_prompt': "You are an expert at identifying viral-worthy moments in videos. Find clips with high shareability and social media potential.",
-                'scoring_criteria': "Rate based on shareability, uniqueness, trending potential, and social media appeal."
-            }
-        }
-        
         self.providers = {
             "openai": self._analyze_with_openai,
             "gemini": self._analyze_with_gemini,
@@ -71,7 +187,9 @@ class AIAnalyzer:
     async def analyze_video(self, video_path: str, prompt: str, provider: str, api_key: str, 
                            model_settings: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """Analyze a video using the specified AI provider"""
-        if not os.path.exists(video_path):
+        try:
+            video_mtime = os.stat(video_path).st_mtime_ns
+        except FileNotFoundError:
             raise FileNotFoundError(f"Video file not found: {video_path}")
         
         logger.info(f"Analyzing video with {provider}: {video_path}")
@@ -80,18 +198,33 @@ class AIAnalyzer:
             logger.warning(f"Unknown provider: {provider}, falling back to mock analysis")
             return await self._mock_analysis(video_path, prompt)
         
+        # The mtime is part of the key, so a replaced video is analyzed afresh
+        cache_key = hashlib.sha256(
+            f"{provider}|{prompt}|{video_path}|{video_mtime}|"
+            f"{json.dumps(model_settings, sort_keys=True, default=str)}".encode()
+        ).digest()
+        cached = self._analysis_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Reusing cached {provider} analysis for {video_path}")
+            return copy.deepcopy(cached)
+        
         try:
             # Call the appropriate provider's analysis method
             analysis_func = self.providers[provider]
-            return await analysis_func(video_path, prompt, api_key, model_settings)
+            clips, is_fallback = await analysis_func(video_path, prompt, api_key, model_settings)
+            # Only parsed provider output is cached; mock and fallback clips
+            # are not, so the next request asks the provider again
+            if not is_fallback:
+                self._analysis_cache[cache_key] = copy.deepcopy(clips)
+            return clips
         except Exception as e:
             logger.error(f"Error analyzing video with {provider}: {e}")
             # Fall back to mock analysis
             return await self._mock_analysis(video_path, prompt)
     
     async def _analyze_with_openai(self, video_path: str, prompt: str, api_key: str,
-                                model_settings: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
-        """Analyze video using OpenAI"""
+                                model_settings: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """Analyze video using OpenAI. Returns (clips, is_fallback)"""
         # This is just a mock implementation
         # In a real implementation, you would:
         # 1. Extract frames from the video
@@ -101,164 +234,196 @@ class AIAnalyzer:
         logger.info("Mock OpenAI analysis running")
         await asyncio.sleep(2)  # Simulate processing time
         
-        return await self._mock_analysis(video_path, prompt)
+        return await self._mock_analysis(video_path, prompt), True
     
     async def _analyze_with_gemini(self, video_path: str, prompt: str, api_key: str,
-                                model_settings: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
-        """Analyze video using Google Gemini"""
+                                model_settings: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """Analyze video using Google Gemini. Returns (clips, is_fallback)"""
         # Mock implementation
         logger.info("Mock Gemini analysis running")
         await asyncio.sleep(2)  # Simulate processing time
         
-        return await self._mock_analysis(video_path, prompt)
+        return await self._mock_analysis(video_path, prompt), True
     
     async def _analyze_with_lmstudio(self, video_path: str, prompt: str, api_key: str,
-                                   model_settings: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
-        """Analyze video segments using LM Studio local API"""
-        if not requests:
-            raise ImportError("Requests library not installed")
+                                   model_settings: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Analyze video segments using LM Studio local API. Returns
+        (clips, is_fallback); is_fallback is set if any shard's response
+        could not be parsed.
+        """
+        model_settings = model_settings or {}
         
         try:
             # LM Studio typically runs on localhost:1234
             base_url = model_settings.get('lmstudio_url', 'http://localhost:1234')
             
             # Get analysis template
-            template = self.analysis_templates.get(prompt.lower(), self.analysis_templates['engagement'])
+            template_name = prompt.lower()
+            if template_name not in ANALYSIS_TEMPLATES:
+                template_name = 'engagement'
             
-            # Create analysis prompt
-            analysis_prompt = self._create_analysis_prompt(prompt, template)
+            # Segments are extracted once (one ffprobe run) and shared by the
+            # prompt and the fallback clips
+            segments = await self._extract_analysis_segments(video_path)
+            system_prompt = ANALYSIS_SYSTEM_PROMPTS[template_name]
             
-            # Prepare request
-            payload = {
-                "model": model_settings.get('model', 'local-model'),
-                "messages": [
-                    {"role": "system", "content": template['system_prompt']},
-                    {"role": "user", "content": analysis_prompt}
-                ],
-                "temperature": model_settings.get('temperature', 0.7),
-                "max_tokens": model_settings.get('max_tokens', 2000)
-            }
-            
-            # Make request
-            async with asyncio.timeout(120):  # 2 minute timeout
-                response = requests.post(
-                    f"{base_url}/v1/chat/completions",
-                    json=payload,
-                    headers={"Content-Type": "application/json"}
+            # Long videos are split into shards analyzed concurrently; every
+            # shard request shares the same cacheable system prefix
+            shards = [
+                segments[i:i + ANALYSIS_SHARD_SEGMENTS]
+                for i in range(0, len(segments), ANALYSIS_SHARD_SEGMENTS)
+            ]
+            if len(shards) == 1:
+                return await self._request_lmstudio_clips(
+                    base_url, model_settings, system_prompt, prompt, segments
                 )
             
-            if response.status_code != 200:
-                raise Exception(f"LM Studio API error: {response.status_code} - {response.text}")
+            semaphore = asyncio.Semaphore(ANALYSIS_SHARD_CONCURRENCY)
             
-            result = response.json()
-            content = result['choices'][0]['message']['content']
+            async def analyze_shard(shard: List[Dict]) -> Tuple[List[Dict[str, Any]], bool]:
+                async with semaphore:
+                    return await self._request_lmstudio_clips(
+                        base_url, model_settings, system_prompt, prompt, shard
+                    )
             
-            # Parse response
-            clips = self._parse_ai_response(content)
-            return clips
+            # A failed shard (timeout, API error) only loses its own part of
+            # the video: it gets fallback clips and the rest is kept
+            results = await asyncio.gather(
+                *(analyze_shard(shard) for shard in shards), return_exceptions=True
+            )
+            errors = [result for result in results if isinstance(result, BaseException)]
+            if len(errors) == len(shards):
+                raise errors[0]
+            for error in errors:
+                logger.error(f"LM Studio shard analysis failed: {error}")
+            results = [
+                (self._create_fallback_clips(shard), True) if isinstance(result, BaseException) else result
+                for shard, result in zip(shards, results)
+            ]
+            clips = _merge_overlapping_clips([clip for clips, _ in results for clip in clips])
+            return clips, any(is_fallback for _, is_fallback in results)
             
         except Exception as e:
             logger.error(f"Error with LM Studio analysis: {e}")
             raise
     
+    async def _request_lmstudio_clips(self, base_url: str, model_settings: Dict[str, Any],
+                                      system_prompt: str, prompt: str,
+                                      segments: List[Dict]) -> Tuple[List[Dict[str, Any]], bool]:
+        """Ask LM Studio for clips among the given segments; returns (clips, is_fallback)"""
+        # Create analysis prompt
+        analysis_prompt = self._create_analysis_prompt(prompt, segments)
+        
+        # Prepare request: stable system prefix first, variable request last
+        payload = {
+            "model": model_settings.get('model', 'local-model'),
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": analysis_prompt}
+            ],
+            "temperature": model_settings.get('temperature', 0.7),
+            "max_tokens": model_settings.get('max_tokens', 2000)
+        }
+        
+        # Make request (the client's 2 minute timeout applies)
+        response = await self.http_client.post(
+            f"{base_url}/v1/chat/completions",
+            json=payload
+        )
+        
+        if response.status_code != 200:
+            raise Exception(f"LM Studio API error: {response.status_code} - {response.text}")
+        
+        result = orjson.loads(response.content)
+        content = result['choices'][0]['message']['content']
+        
+        # Parse response
+        return self._parse_ai_response(content, segments)
+    
     async def _analyze_with_anthropic(self, video_path: str, prompt: str, api_key: str,
-                                   model_settings: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
-        """Analyze video using Anthropic"""
+                                   model_settings: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """Analyze video using Anthropic. Returns (clips, is_fallback)"""
         # Mock implementation
         logger.info("Mock Anthropic analysis running")
         await asyncio.sleep(2)  # Simulate processing time
         
-        return await self._mock_analysis(video_path, prompt)
+        return await self._mock_analysis(video_path, prompt), True
     
-    def _create_analysis_prompt(self, user_prompt: str, template: Dict) -> str:
-        """Create structured analysis prompt for AI"""
-        prompt = f"""
-User Request: {user_prompt}
-
-Scoring Criteria: {template['scoring_criteria']}
-
-Video Segments to Analyze:
-"""
-        
-        for segment in self._extract_analysis_segments(video_path):
-            prompt += f"\nSegment {segment['index'] + 1}: {segment['start']:.1f}s - {segment['end']:.1f}s ({segment['duration']:.1f}s duration)"
-        
-        prompt += """
-
-Please analyze these video segments and identify the best clips that match the user's request. For each recommended clip, provide:
-
-1. Segment number(s) it spans
-2. Exact start and end times (in seconds)
-3. A catchy title (max 50 characters)
-4. A score from 0-100 based on the criteria
-5. A brief explanation (1-2 sentences) of why this clip is valuable
-
-Format your response as JSON with this structure:
-{
-  "clips": [
-    {
-      "title": "Clip title",
-      "start_time": 0.0,
-      "end_time": 15.0,
-      "score": 85,
-      "explanation": "Brief explanation of why this clip is valuable."
-    }
-  ]
-}
-
-Provide 3-8 clips, focusing on the highest quality moments that best match the user's request.
-"""
-        
-        return prompt
+    def _create_analysis_prompt(self, user_prompt: str, segments: List[Dict]) -> str:
+        """
+        Create the per-request part of the analysis prompt. Criteria and
+        output format are in the template's system prompt.
+        """
+        segment_lines = "".join([
+            f"\nSegment {segment['index'] + 1}: {segment['start']:.1f}s - {segment['end']:.1f}s ({segment['duration']:.1f}s duration)"
+            for segment in segments
+        ])
+        return f"User Request: {user_prompt}\n\nVideo Segments to Analyze:\n{segment_lines}"
     
-    def _parse_ai_response(self, response_text: str) -> List[Dict[str, Any]]:
-        """Parse AI response and create Clip objects"""
+    def _parse_ai_response(self, response_text: str, segments: List[Dict]) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Parse AI response and create Clip objects. Returns (clips, is_fallback);
+        is_fallback is True when the response could not be parsed and the
+        clips are placeholders from _create_fallback_clips.
+        """
         try:
-            # Try to extract JSON from response
-            json_start = response_text.find('{')
-            json_end = response_text.rfind('}') + 1
-            
-            if json_start == -1 or json_end == 0:
-                raise ValueError("No JSON found in response")
-            
-            json_text = response_text[json_start:json_end]
-            data = json.loads(json_text)
+            # Usually the whole response is the JSON object; otherwise
+            # extract it from the surrounding text
+            try:
+                data = orjson.loads(response_text)
+            except orjson.JSONDecodeError:
+                json_start = response_text.find('{')
+                json_end = response_text.rfind('}') + 1
+                
+                if json_start == -1 or json_end == 0:
+                    raise ValueError("No JSON found in response")
+                
+                data = orjson.loads(response_text[json_start:json_end])
+            if not isinstance(data, dict):
+                raise ValueError("Response JSON is not an object")
             
             clips = []
             for i, clip_data in enumerate(data.get('clips', [])):
                 try:
-                    clip = {
-                        "id": f"clip_{i}_{int(clip_data['start_time'])}_{int(clip_data['end_time'])}",
+                    # Convert and validate before building the clip, so
+                    # invalid clips cost no dict and defaults apply to the id
+                    start_time = float(clip_data.get('start_time', 0))
+                    end_time = float(clip_data.get('end_time', 30))
+                    score = int(clip_data.get('score', 50))
+                    if end_time <= start_time or not 0 <= score <= 100:
+                        continue
+                    
+                    clips.append({
+                        # From the time range alone, so ids stay unique
+                        # when shard results are merged
+                        "id": f"clip_{int(start_time * 1000)}_{int(end_time * 1000)}",
                         "title": clip_data.get('title', f"Clip {i+1}"),
-                        "start_time": float(clip_data.get('start_time', 0)),
-                        "end_time": float(clip_data.get('end_time', 30)),
-                        "score": int(clip_data.get('score', 50)),
+                        "start_time": start_time,
+                        "end_time": end_time,
+                        "score": score,
                         "explanation": clip_data.get('explanation', 'AI-generated clip')
-                    }
-                    
-                    # Validate clip timing
-                    if clip["end_time"] > clip["start_time"] and clip["score"] >= 0 and clip["score"] <= 100:
-                        clips.append(clip)
+                    })
                     
                 except Exception as e:
                     logger.warning(f"Error parsing clip {i}: {e}")
                     continue
             
-            return clips
+            return clips, False
             
         except Exception as e:
             logger.error(f"Error parsing AI response: {e}")
             # Fallback: create default clips
-            return self._create_fallback_clips()
+            return self._create_fallback_clips(segments), True
     
-    def _create_fallback_clips(self) -> List[Dict[str, Any]]:
+    def _create_fallback_clips(self, segments: List[Dict]) -> List[Dict[str, Any]]:
         """Create fallback clips when AI parsing fails"""
         clips = []
         
         # Create clips from first few segments
-        for i, segment in enumerate(self._extract_analysis_segments()[:5]):
+        for i, segment in enumerate(segments[:5]):
             clip = {
-                "id": f"fallback_clip_{i}",
+                "id": f"fallback_clip_{segment['index']}",
                 "title": f"Interesting Moment {i+1}",
                 "start_time": segment['start'],
                 "end_time": min(segment['start'] + 15, segment['end']),  # 15 second clips
@@ -271,49 +436,23 @@ Provide 3-8 clips, focusing on the highest quality moments that best match the u
     
     async def _mock_analysis(self, video_path: str, prompt: str) -> List[Dict[str, Any]]:
         """Generate mock analysis results for demo purposes"""
-        # Mock data for clips
-        clip_types = {
-            "funny": [
-                ("Hilarious reaction", "Subject displays an unexpected and humorous reaction", 85),
-                ("Comedy gold moment", "Classic comedic timing and delivery", 92),
-                ("Unexpected humor", "Surprising comedic twist that engages viewers", 78)
-            ],
-            "engaging": [
-                ("Hook moment", "Strong opening that captures attention immediately", 88),
-                ("Peak engagement", "Highest point of audience interest and engagement", 94),
-                ("Attention grabber", "Visually striking or surprising content", 82)
-            ],
-            "educational": [
-                ("Key insight", "Important information delivered clearly", 90),
-                ("Learning moment", "Clear explanation of a complex concept", 87),
-                ("Important concept", "Foundational idea explained well", 85)
-            ],
-            "emotional": [
-                ("Touching moment", "Genuine emotional connection established", 89),
-                ("Emotional peak", "Height of emotional impact in the content", 93),
-                ("Heartfelt scene", "Authentic emotional display that resonates", 86)
-            ]
-        }
-        
         # Determine clip type based on prompt
-        clip_type = "engaging"  # default
-        for key in clip_types.keys():
-            if key.lower() in prompt.lower():
-                clip_type = key
-                break
+        words = _prompt_words(prompt)
+        clip_type = next((key for key in MOCK_CLIP_KEYS if key in words), "engaging")
         
-        selected_clips = clip_types[clip_type]
+        selected_clips = MOCK_CLIP_TYPES[clip_type]
         results = []
         
         # Create 3-5 clips with slight variations
         num_clips = random.randint(3, 5)
         video_length = 300  # mock 5 minute video
+        segment_size = video_length / num_clips
+        timestamp = int(time.time())
         
         for i in range(num_clips):
             clip_template = random.choice(selected_clips)
             
             # Calculate clip timestamps (ensure they don't overlap)
-            segment_size = video_length / num_clips
             start_time = i * segment_size + random.uniform(0, segment_size * 0.3)
             duration = random.uniform(8, 15)  # 8-15 seconds
             end_time = min(start_time + duration, (i + 1) * segment_size)
@@ -324,7 +463,7 @@ Provide 3-8 clips, focusing on the highest quality moments that best match the u
             
             # Create clip data
             clip = {
-                "id": f"clip_{int(time.time())}_{i}",
+                "id": f"clip_{timestamp}_{i}",
                 "title": clip_template[0],
                 "description": clip_template[1],
                 "start_time": start_time,
@@ -342,7 +481,25 @@ Provide 3-8 clips, focusing on the highest quality moments that best match the u
         return results
     
     async def _extract_analysis_segments(self, file_path: str, segment_length: int = 30) -> List[Dict]:
-        """Extract video segments for analysis"""
+        """Extract video segments for analysis (cached; treat the result as read-only)"""
+        key = (file_path, os.stat(file_path).st_mtime_ns, segment_length)
+        segments = self._segment_cache.get(key)
+        if segments is not None:
+            return segments
+        
+        lock = self._segment_locks.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                segments = self._segment_cache.get(key)
+                if segments is None:
+                    segments = await self._build_analysis_segments(file_path, segment_length)
+                    self._segment_cache[key] = segments
+        finally:
+            self._segment_locks.pop(key, None)
+        return segments
+    
+    async def _build_analysis_segments(self, file_path: str, segment_length: int) -> List[Dict]:
+        """Probe the video's duration and split it into overlapping segments"""
         try:
             # Get video metadata
             metadata = await self.video_processor.extract_metadata(file_path)
@@ -352,25 +509,20 @@ Provide 3-8 clips, focusing on the highest quality moments that best match the u
                 raise ValueError("Could not determine video duration")
             
             # Create overlapping segments for analysis
+            step = segment_length * 0.8  # 20% overlap
+            # Segments start every `step` seconds; after the first, a start
+            # is dropped once less than 30% of a segment would remain
+            count = 1 + max(0, math.floor((duration - segment_length * 0.3) / step))
             segments = []
-            current_time = 0
-            overlap = segment_length * 0.2  # 20% overlap
-            
-            while current_time < duration:
-                end_time = min(current_time + segment_length, duration)
-                
+            for index in range(count):
+                start_time = index * step
+                end_time = min(start_time + segment_length, duration)
                 segments.append({
-                    'start': current_time,
+                    'start': start_time,
                     'end': end_time,
-                    'duration': end_time - current_time,
-                    'index': len(segments)
+                    'duration': end_time - start_time,
+                    'index': index
                 })
-                
-                current_time += segment_length - overlap
-                
-                # Avoid very short segments at the end
-                if duration - current_time < segment_length * 0.3:
-                    break
             
             logger.info(f"Created {len(segments)} segments for analysis")
             return segments
@@ -381,19 +533,13 @@ Provide 3-8 clips, focusing on the highest quality moments that best match the u
     
     def _determine_analysis_type(self, prompt: str) -> str:
         """Determine analysis type from user prompt"""
-        prompt_lower = prompt.lower()
+        words = _prompt_words(prompt)
         
-        # Check for keywords in prompt
-        if any(word in prompt_lower for word in ['funny', 'humor', 'laugh', 'comedy', 'hilarious']):
-            return 'humor'
-        elif any(word in prompt_lower for word in ['viral', 'share', 'trending', 'social']):
-            return 'viral'
-        elif any(word in prompt_lower for word in ['teach', 'learn', 'explain', 'educational', 'tutorial']):
-            return 'educational'
-        elif any(word in prompt_lower for word in ['emotional', 'touching', 'sad', 'inspiring', 'heartfelt']):
-            return 'emotional'
-        else:
-            return 'engagement'  # Default
+        # First type (in priority order) sharing a keyword with the prompt
+        return next(
+            (analysis_type for analysis_type, keywords in ANALYSIS_TYPE_KEYWORDS.items() if words & keywords),
+            'engagement'  # Default
+        )
     
     async def test_provider_connection(self, provider: str, api_key: str, settings: Dict) -> Dict[str, Any]:
         """Test connection to AI provider"""
@@ -441,12 +587,9 @@ Provide 3-8 clips, focusing on the highest quality moments that best match the u
     
     async def _test_lmstudio_connection(self, api_key: str, settings: Dict) -> Dict[str, Any]:
         """Test LM Studio connection"""
-        if not requests:
-            return {"success": False, "message": "Requests library not installed"}
-        
         try:
             base_url = settings.get('lmstudio_url', 'http://localhost:1234')
-            response = requests.get(f"{base_url}/v1/models", timeout=10)
+            response = await self.http_client.get(f"{base_url}/v1/models", timeout=10)
             
             if response.status_code == 200:
                 return {"success": True, "message": "LM Studio connection successful"}
@@ -490,7 +633,7 @@ Provide 3-8 clips, focusing on the highest quality moments that best match the u
     async def _get_lmstudio_models(self, api_key: str) -> List[Dict[str, Any]]:
         """Get LM Studio models"""
         try:
-            response = requests.get("http://localhost:1234/v1/models", timeout=10)
+            response = await self.http_client.get("http://localhost:1234/v1/models", timeout=10)
             if response.status_code == 200:
                 models_data = response.json()
                 return [{
@@ -501,4 +644,8 @@ Provide 3-8 clips, focusing on the highest quality moments that best match the u
         except:
             pass
         
-        return [{"id": "local-model", "name": "Local Model", "description": "LM Studio local model"}]
\ No newline at end of file
+        return [{"id": "local-model", "name": "Local Model", "description": "LM Studio local model"}]
+    
+    async def close(self):
+        """Close the HTTP client"""
+        await self.http_client.aclose()
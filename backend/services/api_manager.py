@@ -3,7 +3,9 @@ import logging
 from typing import Dict, List, Optional, Any, Tuple
 import json
 from datetime import datetime, timedelta
+import hashlib
 import httpx
+from cachetools import TTLCache
 from sqlalchemy.orm import Session
 
 # Provider-specific imports
@@ -53,9 +55,11 @@ class APIManager:
             }
         }
         
-        # Connection cache
-        self.connection_cache = {}
-        self.cache_timeout = timedelta(minutes=5)
+        # Recent successful connection tests keyed by (provider, sha256(api_key)),
+        # so "test, then save" only calls the provider once. The plaintext
+        # key never becomes part of a cache key.
+        self.connection_cache = TTLCache(maxsize=128, ttl=60)
+        self.connection_test_timeout = 5.0
         
         # Rate limiting
         self.rate_limits = {
@@ -147,17 +151,31 @@ class APIManager:
         if provider not in self.providers:
             return {"success": False, "message": f"Unsupported provider: {provider}"}
         
-        provider_info = self.providers[provider]
+        cache_key = (provider, hashlib.sha256(api_key.encode()).digest())
+        cached = self.connection_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
         try:
             if provider == "openai":
-                return await self._test_openai(api_key)
+                test = self._test_openai(api_key)
             elif provider == "gemini":
-                return await self._test_gemini(api_key)
+                test = self._test_gemini(api_key)
             elif provider == "anthropic":
-                return await self._test_anthropic(api_key)
+                test = self._test_anthropic(api_key)
             else:
                 return {"success": False, "message": f"No test implementation for {provider}"}
+            
+            # Don't let a slow provider hold the request open
+            result = await asyncio.wait_for(test, timeout=self.connection_test_timeout)
+            # Failures aren't cached, so a fixed key or a just-started
+            # LM Studio is picked up on the next test
+            if result.get("success"):
+                self.connection_cache[cache_key] = result
+            return result
+        except asyncio.TimeoutError:
+            logger.error(f"Timed out testing {provider} connection")
+            return {"success": False, "message": f"Timed out connecting to {provider}"}
         except Exception as e:
             logger.error(f"Error testing {provider} connection: {e}")
             return {"success": False, "message": str(e)}
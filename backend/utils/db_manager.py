@@ -1,11 +1,14 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 import os
 from contextlib import contextmanager
+from datetime import datetime, timedelta
 import logging
 
 from models.database import Base
+from config import settings
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -13,23 +16,108 @@ logger = logging.getLogger(__name__)
 # Get the DB URL from environment variable or use SQLite as default
 DB_URL = os.environ.get("DATABASE_URL", "sqlite:///./openclip.db")
 
+# Pool sizing only applies to server databases; SQLite uses its own pool
+pool_args = {} if DB_URL.startswith("sqlite") else {
+    "pool_size": settings.DATABASE_POOL_SIZE,
+    "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+    "pool_recycle": settings.DATABASE_POOL_RECYCLE,
+    "pool_pre_ping": False  # recycle handles stale connections without a ping per checkout
+}
+
+# Compiled SQL is cached per statement shape. The default (500 entries)
+# is easily outgrown once ORM loader options and both engines' statements
+# are counted, and evicted statements get recompiled on every request.
+cache_args = {"query_cache_size": settings.DATABASE_QUERY_CACHE_SIZE}
+
 # Create engine
 engine = create_engine(
     DB_URL, 
     connect_args={"check_same_thread": False} if DB_URL.startswith("sqlite") else {},
-    echo=False  # Set to True for SQL debugging
+    echo=False,  # Set to True for SQL debugging
+    **cache_args,
+    **pool_args
 )
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 SessionScoped = scoped_session(SessionLocal)
 
+# Async engine for endpoints that shouldn't block the event loop on DB I/O
+ASYNC_DB_URL = (
+    DB_URL.replace("sqlite:///", "sqlite+aiosqlite:///", 1)
+    .replace("postgresql://", "postgresql+asyncpg://", 1)
+)
+async_engine = create_async_engine(ASYNC_DB_URL, echo=False, **cache_args, **pool_args)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
 # Initialize database tables
 def init_db():
     """Initialize the database tables"""
     Base.metadata.create_all(bind=engine)
     logger.info("Database tables created")
 
+# Keep future audit_logs partitions in place (PostgreSQL only)
+_AUDIT_LOGS_PARTITIONED_SQL = text(
+    "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+    "WHERE partrelid = to_regclass('audit_logs'))"
+)
+_AUDIT_LOGS_DEFAULT_PARTITION_SQL = text("""
+    SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'audit_logs'::regclass
+      AND pg_get_expr(c.relpartbound, c.oid) = 'DEFAULT'
+""")
+# Arbitrary key serializing concurrent callers
+_AUDIT_PARTITION_LOCK_ID = 0x617564697401
+
+def ensure_audit_log_partitions(months_ahead: int = 2):
+    """
+    Create monthly audit_logs partitions up to months_ahead from now.
+    Does nothing unless audit_logs is partitioned (init_db creates a plain
+    table). Rows already in the DEFAULT partition for a new month are
+    moved into it, since PostgreSQL refuses the partition otherwise.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    start = datetime.utcnow().date().replace(day=1)
+    with engine.begin() as conn:
+        if not conn.scalar(_AUDIT_LOGS_PARTITIONED_SQL):
+            return
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": _AUDIT_PARTITION_LOCK_ID})
+        default_partition = conn.scalar(_AUDIT_LOGS_DEFAULT_PARTITION_SQL)
+        for _ in range(months_ahead + 1):
+            end = (start + timedelta(days=32)).replace(day=1)
+            partition = f"audit_logs_{start:%Y_%m}"
+            bounds = {"start": start, "end": end}
+            create_partition = text(
+                f"CREATE TABLE {partition} PARTITION OF audit_logs "
+                f"FOR VALUES FROM ('{start}') TO ('{end}')"
+            )
+            if conn.scalar(text("SELECT to_regclass(:name)"), {"name": partition}) is not None:
+                start = end
+                continue
+            if default_partition and conn.scalar(text(
+                f"SELECT EXISTS (SELECT 1 FROM {default_partition} "
+                f"WHERE created_at >= :start AND created_at < :end)"
+            ), bounds):
+                # Move the month's rows out of DEFAULT into the new partition
+                conn.execute(text(f"ALTER TABLE audit_logs DETACH PARTITION {default_partition}"))
+                conn.execute(create_partition)
+                conn.execute(text(
+                    f"INSERT INTO {partition} SELECT * FROM {default_partition} "
+                    f"WHERE created_at >= :start AND created_at < :end"
+                ), bounds)
+                conn.execute(text(
+                    f"DELETE FROM {default_partition} "
+                    f"WHERE created_at >= :start AND created_at < :end"
+                ), bounds)
+                conn.execute(text(f"ALTER TABLE audit_logs ATTACH PARTITION {default_partition} DEFAULT"))
+            else:
+                conn.execute(create_partition)
+            start = end
+    logger.info("Audit log partitions ensured")
+
 # Dependency to get DB session
 def get_db():
     """Get a database session"""
@@ -39,6 +127,12 @@ def get_db():
     finally:
         db.close()
 
+# Async dependency to get DB session
+async def get_async_db():
+    """Get an async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
 # Context manager for DB session
 @contextmanager
 def get_db_session():
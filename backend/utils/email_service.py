@@ -9,8 +9,9 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from typing import Optional, List
 from datetime import datetime, timedelta
-from jose import jwt
+import jwt
 import asyncio
+import aiosmtplib
 from jinja2 import Template
 
 from ..config import settings
@@ -112,6 +113,118 @@ class EmailService:
         
         if not self.smtp_enabled:
             logger.warning("SMTP not configured. Emails will be logged to console.")
+        
+        # Outgoing mail is queued and sent by one worker over a persistent
+        # SMTP connection, so request handlers never wait on SMTP
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._smtp: Optional[aiosmtplib.SMTP] = None
+    
+    async def start(self):
+        """Start the background mail worker (call once on app startup)"""
+        if self._worker is None:
+            self._queue = asyncio.Queue(maxsize=1000)
+            self._worker = asyncio.create_task(self._mail_worker())
+    
+    async def stop(self, timeout: float = 10.0):
+        """
+        Send what is still queued, then stop the worker and QUIT the SMTP
+        connection (call once on app shutdown). Emails still queued after
+        timeout seconds are dropped and logged.
+        """
+        if self._worker is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Mail queue not drained at shutdown, dropping {self._queue.qsize()} emails")
+        self._worker.cancel()
+        await asyncio.gather(self._worker, return_exceptions=True)
+        self._worker = None
+        self._queue = None
+        if self._smtp is not None and self._smtp.is_connected:
+            try:
+                await self._smtp.quit()
+            except aiosmtplib.SMTPException as e:
+                logger.warning(f"SMTP QUIT failed: {e}")
+        self._smtp = None
+    
+    async def _mail_worker(self):
+        """Drain the queue, reusing one SMTP connection between messages"""
+        while True:
+            message = await self._queue.get()
+            try:
+                if not self.smtp_enabled:
+                    logger.info(f"EMAIL TO: {message['To']}")
+                    logger.info(f"SUBJECT: {message['Subject']}")
+                    continue
+                try:
+                    await self._smtp_send(message)
+                except aiosmtplib.SMTPServerDisconnected:
+                    # The server closed the idle connection; is_connected
+                    # can't tell until a command fails, so reconnect and retry
+                    self._smtp = None
+                    await self._smtp_send(message)
+                logger.info(f"Email sent successfully to {message['To']}")
+            except Exception as e:
+                logger.error(f"Failed to send email to {message['To']}: {e}")
+                # Drop the connection; the next message reconnects
+                self._smtp = None
+            finally:
+                self._queue.task_done()
+    
+    async def _smtp_send(self, message: MIMEMultipart):
+        """Send over the shared connection, (re)connecting first if needed"""
+        if self._smtp is None or not self._smtp.is_connected:
+            self._smtp = aiosmtplib.SMTP(
+                hostname=settings.SMTP_HOST,
+                port=settings.SMTP_PORT,
+                start_tls=True
+            )
+            await self._smtp.connect()
+            await self._smtp.login(settings.SMTP_USERNAME, settings.SMTP_PASSWORD)
+        await self._smtp.send_message(message)
+    
+    def _build_message(
+        self,
+        to_email: str,
+        subject: str,
+        html_content: str,
+        text_content: Optional[str] = None
+    ) -> MIMEMultipart:
+        """Build a multipart text/HTML message"""
+        message = MIMEMultipart("alternative")
+        message["Subject"] = subject
+        message["From"] = f"{settings.SMTP_FROM_NAME} <{settings.SMTP_FROM_EMAIL}>"
+        message["To"] = to_email
+        
+        # Add text and HTML parts
+        if text_content:
+            message.attach(MIMEText(text_content, "plain"))
+        message.attach(MIMEText(html_content, "html"))
+        return message
+    
+    async def queue_email(
+        self,
+        to_email: str,
+        subject: str,
+        html_content: str,
+        text_content: Optional[str] = None
+    ) -> bool:
+        """
+        Queue an email for the background worker. Falls back to sending
+        inline if the worker isn't running; returns False if the queue is full.
+        """
+        if self._queue is None:
+            return await self.send_email(to_email, subject, html_content, text_content)
+        try:
+            self._queue.put_nowait(
+                self._build_message(to_email, subject, html_content, text_content)
+            )
+            return True
+        except asyncio.QueueFull:
+            logger.error(f"Mail queue full, dropping email to {to_email}")
+            return False
     
     async def send_email(
         self, 
@@ -153,18 +266,7 @@ class EmailService:
                 return True
             
             # Create message
-            message = MIMEMultipart("alternative")
-            message["Subject"] = subject
-            message["From"] = f"{settings.SMTP_FROM_NAME} <{settings.SMTP_FROM_EMAIL}>"
-            message["To"] = to_email
-            
-            # Add text and HTML parts
-            if text_content:
-                text_part = MIMEText(text_content, "plain")
-                message.attach(text_part)
-            
-            html_part = MIMEText(html_content, "html")
-            message.attach(html_part)
+            message = self._build_message(to_email, subject, html_content, text_content)
             
             # Send email
             with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT) as server:
@@ -202,8 +304,8 @@ class EmailService:
             current_year=datetime.now().year
         )
         
-        # Send email
-        return await self.send_email(
+        # Queue email
+        return await self.queue_email(
             to_email=email,
             subject=f"Verify your {settings.APP_NAME} account",
             html_content=html_content,
@@ -233,8 +335,8 @@ class EmailService:
             current_year=datetime.now().year
         )
         
-        # Send email
-        return await self.send_email(
+        # Queue email
+        return await self.queue_email(
             to_email=email,
             subject=f"Reset your {settings.APP_NAME} password",
             html_content=html_content,
@@ -257,7 +359,7 @@ class EmailService:
         <p>Happy clipping!</p>
         """
         
-        return await self.send_email(
+        return await self.queue_email(
             to_email=email,
             subject=f"Welcome to {settings.APP_NAME}!",
             html_content=html_content
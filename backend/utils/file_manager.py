@@ -1,7 +1,8 @@
 import os
 import shutil
+import asyncio
 import aiofiles
-from typing import Optional, List, Dict, Any, BinaryIO
+from typing import Optional, List, Dict, Any, BinaryIO, Tuple
 from pathlib import Path
 import hashlib
 import mimetypes
@@ -155,12 +156,15 @@ class FileManager:
         else:
             return f"{timestamp}_{file_hash}"
     
-    async def save_upload(self, file: UploadFile, project_id: str) -> str:
-        """Save an uploaded file to the uploads directory"""
-        # Create project directory if it doesn't exist
+    async def save_upload(
+        self, file: UploadFile, project_id: str, max_bytes: Optional[int] = None
+    ) -> Tuple[str, int]:
+        """
+        Save an uploaded file to the uploads directory.
+        Returns the path and the number of bytes written; raises 413 as soon
+        as the upload passes max_bytes, whatever size the client declared.
+        """
         project_dir = os.path.join(self.uploads_dir, project_id)
-        if not os.path.exists(project_dir):
-            os.makedirs(project_dir)
         
         # Generate secure filename
         secure_filename = self._generate_secure_filename(file.filename)
@@ -168,17 +172,45 @@ class FileManager:
         
         # Save file
         try:
-            async with aiofiles.open(file_path, 'wb') as out_file:
-                # Read chunks to handle large files
-                while content := await file.read(1024 * 1024):  # 1MB chunks
-                    await out_file.write(content)
+            # The request body is already spooled to a temp file; copy it in
+            # one worker thread rather than hopping threads per chunk
+            size = await asyncio.to_thread(
+                self._copy_upload, file.file, project_dir, file_path, max_bytes
+            )
             
             logger.info(f"File saved: {file_path}")
-            return file_path
+            return file_path, size
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error saving file {file.filename}: {e}")
             raise
     
+    @staticmethod
+    def _copy_upload(
+        source: BinaryIO, project_dir: str, file_path: str, max_bytes: Optional[int]
+    ) -> int:
+        """
+        Stream an upload to disk in 1MB chunks, stopping once it exceeds
+        max_bytes (blocking; run in a thread). Returns the bytes written.
+        """
+        os.makedirs(project_dir, exist_ok=True)
+        source.seek(0)
+        total = 0
+        try:
+            with open(file_path, 'wb') as out_file:
+                while chunk := source.read(1024 * 1024):
+                    total += len(chunk)
+                    if max_bytes is not None and total > max_bytes:
+                        raise HTTPException(status_code=413, detail="File too large")
+                    out_file.write(chunk)
+        except BaseException:
+            # Don't leave a partial file behind
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
+        return total
+    
     async def create_temp_file(self, filename: str = None) -> str:
         """Create a temporary file and return its path"""
         if not filename:
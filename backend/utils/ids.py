@@ -0,0 +1,38 @@
+"""
+Time-ordered UUIDs (UUIDv7, RFC 9562) for primary keys.
+Rows created close together get neighbouring ids, so inserts land on the
+same index pages instead of splitting random B-tree leaves.
+"""
+
+import os
+import threading
+import time
+import uuid
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+def uuid7() -> uuid.UUID:
+    """
+    Generate a UUIDv7: 48-bit Unix milliseconds, a 12-bit counter that keeps
+    ids from the same millisecond increasing, then 62 random bits.
+    """
+    global _last_ms, _counter
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms > _last_ms:
+            _last_ms = now_ms
+            _counter = 0
+        else:
+            # Same millisecond (or clock went back): count up, borrowing
+            # the next millisecond if the counter runs out
+            _counter += 1
+            if _counter > 0xFFF:
+                _last_ms += 1
+                _counter = 0
+        ms, counter = _last_ms, _counter
+
+    rand = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    value = (ms & ((1 << 48) - 1)) << 80 | 0x7 << 76 | counter << 64 | 0b10 << 62 | rand
+    return uuid.UUID(int=value)
@@ -1,6 +1,6 @@
 from typing import Any, Dict, List, Optional, Union
 from fastapi import HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from datetime import datetime
 import traceback
 from enum import Enum
@@ -40,7 +40,7 @@ class StandardResponse:
         error_code: Optional[str] = None,
         details: Optional[Dict[str, Any]] = None,
         status_code: int = 500
-    ) -> JSONResponse:
+    ) -> ORJSONResponse:
         """Create an error response"""
         error_data = {
             "status": ResponseStatus.ERROR.value,
@@ -52,7 +52,7 @@ class StandardResponse:
         if details:
             error_data["details"] = details
             
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=status_code,
             content=error_data
         )
@@ -61,7 +61,7 @@ class StandardResponse:
     def validation_error(
         message: str = "Validation failed",
         field_errors: Optional[Dict[str, str]] = None
-    ) -> JSONResponse:
+    ) -> ORJSONResponse:
         """Create a validation error response"""
         error_data = {
             "status": ResponseStatus.ERROR.value,
@@ -73,7 +73,7 @@ class StandardResponse:
         if field_errors:
             error_data["field_errors"] = field_errors
             
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=422,
             content=error_data
         )
@@ -112,7 +112,7 @@ class ErrorHandler:
         error: Exception,
         context: Optional[Dict[str, Any]] = None,
         include_traceback: bool = False
-    ) -> JSONResponse:
+    ) -> ORJSONResponse:
         """Handle and format exceptions"""
         
         # Known exceptions
@@ -13,7 +13,7 @@ from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from typing import Optional, Dict, Any
 from datetime import datetime, timedelta
-from passlib.context import CryptContext
+import bcrypt
 from fastapi import HTTPException, status
 import re
 
@@ -29,7 +29,6 @@ class SecurityManager:
     
     def __init__(self):
         self.cipher_suite = self._initialize_cipher()
-        self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
         
     def _initialize_cipher(self) -> Fernet:
         """
@@ -81,11 +80,14 @@ class SecurityManager:
     
     def hash_password(self, password: str) -> str:
         """Hash a password using bcrypt"""
-        return self.pwd_context.hash(password)
+        return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=12)).decode()
     
     def verify_password(self, plain_password: str, hashed_password: str) -> bool:
         """Verify a password against its hash"""
-        return self.pwd_context.verify(plain_password, hashed_password)
+        try:
+            return bcrypt.checkpw(plain_password.encode(), hashed_password.encode())
+        except ValueError:
+            return False
     
     def hash_api_key(self, api_key: str) -> str:
         """
@@ -175,8 +175,22 @@ const useProjectStore = create(
             throw new Error('Backend connection required to analyze videos.');
           }
           
-          const response = await apiService.analyzeVideo(projectId, project.analysisPrompt, provider, model);
-          const updatedProject = response.project || response; // Extract project from response
+          await apiService.analyzeVideo(projectId, project.analysisPrompt, provider, model);
+          
+          // Analysis runs in the background; poll the project until it finishes
+          const deadline = Date.now() + 180000; // 3 minutes
+          let updatedProject;
+          do {
+            await new Promise(resolve => setTimeout(resolve, 2000));
+            ({ project: updatedProject } = await apiService.getProject(projectId));
+          } while (updatedProject.status === 'analyzing' && Date.now() < deadline);
+          
+          if (updatedProject.status === 'error') {
+            throw new Error(updatedProject.error_message || 'Analysis failed');
+          }
+          if (updatedProject.status === 'analyzing') {
+            throw new Error('Analysis is taking longer than expected');
+          }
           get().updateProject(projectId, updatedProject);
           set({
             isProcessing: false,
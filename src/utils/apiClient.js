@@ -166,9 +166,8 @@ class APIClient {
     if (provider) payload.provider = provider
     if (model) payload.model = model
 
-    return this.client.post(`/api/projects/${projectId}/analyze`, payload, {
-      timeout: 180000, // 3 minutes for analysis
-    })
+    // Returns 202 as soon as the analysis is queued
+    return this.client.post(`/api/projects/${projectId}/analyze`, payload)
   }
 
   // Clips